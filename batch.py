@@ -0,0 +1,141 @@
+"""
+Render many pages without a display: every url (or file path) is fetched, parsed,
+laid out and painted with the headless fonts (see font.font) in a pool of worker
+processes, and one JSON object per page is written, in the order of the input:
+
+    {"url": ..., "timings": {"fetch": ms, "parse": ms, "layout": ms, "paint": ms},
+     "height": ..., "display_list": [...]}
+
+with "layout_tree" instead of "display_list" under --tree, and {"url": ..., "error": ...}
+for the pages that failed.
+
+Usage:
+    python batch.py [-j JOBS] [-w WIDTH] [--tree] [-i LIST] [-o OUTPUT] [url ...]
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse, json, os, sys, time
+
+from transfer.transferutil import get, Cache
+import transfer.transferutil as transferutil
+from response.response import HTMLParser, Element
+from font.font import set_font_backend
+import browser
+
+def _init_worker(width):
+    """
+    The workers cache in memory only: the disk cache is not safe to share between
+    processes (every one rewrites its index and deletes the bodies it does not know).
+    """
+    set_font_backend("headless")
+    browser.WIDTH = width
+    transferutil.CENTRAL_CACHE = Cache()
+
+def render_page(url, tree=False) -> dict:
+    """
+    Fetch, parse, lay out and paint the page at the url and return its JSON object
+    (see the module docstring). Runs in the worker processes.
+    """
+    timings = {}
+    try:
+        start = time.perf_counter()
+        response = get(url)
+        timings['fetch'] = _elapsed_ms(start)
+
+        start = time.perf_counter()
+        tokens = HTMLParser(response.get_raw_body()).parse()
+        timings['parse'] = _elapsed_ms(start)
+
+        start = time.perf_counter()
+        document = browser.DocumentLayout(tokens)
+        document.layout()
+        timings['layout'] = _elapsed_ms(start)
+
+        start = time.perf_counter()
+        display_list = browser.paint_page(document)
+        timings['paint'] = _elapsed_ms(start)
+    except Exception as e:
+        return {'url': url, 'error': "{}: {}".format(type(e).__name__, e), 'timings': timings}
+
+    page = {'url': url, 'timings': timings, 'height': document.height}
+    if tree:
+        page['layout_tree'] = _layout_summary(document)
+    else:
+        page['display_list'] = [_command_summary(display_list, i) for i in range(len(display_list))]
+    return page
+
+def render_all(urls, jobs=None, width=browser.WIDTH, tree=False):
+    """
+    Yield (failed, JSON line) of the pages at the urls, in order, rendered by 'jobs'
+    worker processes (one per core by default). The workers encode the JSON too,
+    so the main process only has the lines to write.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    # Big enough chunks to keep the pool overhead low, small enough to balance the load.
+    chunksize = max(1, len(urls) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(width,)) as pool:
+        yield from pool.map(_render_line, urls, [tree] * len(urls), chunksize=chunksize)
+
+def _render_line(url, tree):
+    page = render_page(url, tree)
+    return 'error' in page, json.dumps(page)
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 3)
+
+def _command_summary(display_list, i) -> dict:
+    value = display_list.strings[display_list.values[i]]
+    if display_list.kinds[i] == browser.TEXT:
+        font = display_list.font_table[display_list.fonts[i]].font
+        return {'type': 'text', 'left': display_list.lefts[i], 'top': display_list.tops[i],
+                'bottom': display_list.bottoms[i], 'text': value,
+                'font': [font.size, font.weight, font.slant]}
+    return {'type': 'rect', 'left': display_list.lefts[i], 'top': display_list.tops[i],
+            'right': display_list.rights[i], 'bottom': display_list.bottoms[i], 'color': value}
+
+def _layout_summary(layout) -> dict:
+    node = layout.node
+    return {
+        'layout': type(layout).__name__,
+        'node': node.tag if isinstance(node, Element) else "#text",
+        'x': layout.x, 'y': layout.y, 'width': layout.width, 'height': layout.height,
+        'children': [_layout_summary(child) for child in layout.children],
+    }
+
+def _to_url(arg):
+    """
+    Paths of existing files and directories are taken as file:// urls.
+    """
+    if "://" not in arg and os.path.exists(arg):
+        return "file://" + os.path.abspath(arg)
+    return arg
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render pages without a display.")
+    parser.add_argument('urls', nargs='*', help="urls or file paths")
+    parser.add_argument('-i', '--input', help="file with one url or path per line, - for stdin")
+    parser.add_argument('-o', '--output', help="file to write the JSON lines to (stdout by default)")
+    parser.add_argument('-j', '--jobs', type=int, help="worker processes (one per core by default)")
+    parser.add_argument('-w', '--width', type=int, default=browser.WIDTH, help="page width in pixels")
+    parser.add_argument('--tree', action='store_true', help="emit the layout tree instead of the display list")
+    args = parser.parse_args(argv)
+
+    urls = list(args.urls)
+    if args.input:
+        f = sys.stdin if args.input == '-' else open(args.input)
+        with f:
+            urls += [line.strip() for line in f if line.strip()]
+    urls = [_to_url(url) for url in urls]
+
+    out = open(args.output, 'w') if args.output else sys.stdout
+    failed = 0
+    try:
+        for page_failed, line in render_all(urls, args.jobs, args.width, args.tree):
+            failed += page_failed
+            out.write(line + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
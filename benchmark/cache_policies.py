@@ -0,0 +1,51 @@
+"""
+Replays a synthetic request trace against the memory cache with each eviction
+policy and compares their hit ratio and bytes saved under the same byte budget.
+
+The trace draws urls with Zipf-like popularity; response sizes are log-normal,
+so a few large responses compete with many small ones, as on real pages.
+
+Run from the repository root:
+    python -m benchmark.cache_policies [requests] [budget_mb]
+"""
+import random, sys, time
+
+from response.response import HTTPResponse
+from transfer.cachepolicy import POLICIES
+from transfer.transferutil import Cache
+
+URLS = 2000
+
+def make_trace(count, seed=0):
+    rng = random.Random(seed)
+    sizes = [min(int(rng.lognormvariate(9.5, 1.5)), 20 * 1024 * 1024) for _ in range(URLS)]
+    weights = [1 / (rank + 1) ** 0.9 for rank in range(URLS)]
+    urls = rng.choices(range(URLS), weights=weights, k=count)
+    return [(url, sizes[url]) for url in urls]
+
+def replay(trace, policy, max_bytes):
+    cache = Cache(max_bytes=max_bytes, policy=policy)
+    expires_at = time.time() + 3600
+    bodies = {}
+    for url, size in trace:
+        key = "http://example.com/{}".format(url)
+        if cache.lookup(key) is None:
+            if size not in bodies:
+                bodies[size] = "x" * size
+            response = HTTPResponse("HTTP/1.1 200 OK\r\n", {"content-length": str(size)}, bodies[size])
+            cache.put(key, {"request": None, "response": response, "expires-at": expires_at})
+    return cache
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    budget = int(float(sys.argv[2]) * 1024 * 1024) if len(sys.argv) > 2 else 16 * 1024 * 1024
+    trace = make_trace(count)
+
+    total = sum(size for _, size in trace)
+    print("{} requests, {:.0f} MB requested, {:.0f} MB budget".format(count, total / 2**20, budget / 2**20))
+    for name in POLICIES:
+        start = time.perf_counter()
+        cache = replay(trace, name, budget)
+        elapsed = time.perf_counter() - start
+        print("{:>5}: hit ratio {:5.1%}, {:7.1f} MB saved, {:5.2f} s".format(
+            name, cache.hit_ratio(), cache.bytes_saved / 2**20, elapsed))
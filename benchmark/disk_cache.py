@@ -0,0 +1,42 @@
+"""
+Cold and warm page loads through the browser cache with a disk tier. The warm
+run starts from a new Cache over the same directory, like a restarted browser.
+
+Run from the repository root:
+    python -m benchmark.disk_cache [pages] [delay_ms]
+"""
+import sys, tempfile, time
+
+from benchmark.server import Fixture, FixtureServer
+from transfer.diskcache import DiskCache
+import transfer.transferutil as transferutil
+
+def slow_page(delay, body):
+    def fixture(handler):
+        time.sleep(delay)
+        return Fixture(body, headers={"Cache-Control": "max-age=3600"})
+    return fixture
+
+def load_all(urls):
+    start = time.perf_counter()
+    for url in urls:
+        transferutil.get(url)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    delay = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.02
+    body = b"<p>Lorem ipsum <b>dolor</b> sit amet.</p>\n" * 5000
+
+    routes = {"/page/{}".format(i): slow_page(delay, body) for i in range(count)}
+    server = FixtureServer(routes).start()
+    urls = [server.url(path) for path in routes]
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ["cold", "warm"]:
+            transferutil.CENTRAL_CACHE = transferutil.Cache(disk=DiskCache(directory))
+            hits_before = sum(server.hits.values())
+            elapsed = load_all(urls)
+            requests = sum(server.hits.values()) - hits_before
+            print("{}: {:6.3f} s for {} pages, {} network requests".format(name, elapsed, count, requests))
+    server.shutdown()
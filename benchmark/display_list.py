@@ -0,0 +1,77 @@
+"""
+Paint time and memory of the columnar browser.DisplayList on a large page,
+against the list of DrawText/DrawRect objects it replaced. Uses the headless
+fonts, so it needs no display.
+
+Run from the repository root:
+    python -m benchmark.display_list [paragraphs]
+"""
+import gc, sys, time, tracemalloc
+
+from benchmark.font_measure import text_page
+from font.font import set_font_backend
+from browser import DocumentLayout, InlineLayout, HTMLParser, paint_page
+
+class DrawText:
+    """
+    The object per word the display list used to hold.
+    """
+    def __init__(self, x1, y1, text, font) -> None:
+        self.top = y1
+        self.left = x1
+        self.text = text
+        self.font = font
+        self.bottom = y1 + font.metrics("linespace")
+
+class ObjectDisplayList:
+    """
+    The display list before the columns: the commands sorted by their top.
+    """
+    def __init__(self, commands) -> None:
+        self.commands = sorted(commands, key=lambda cmd: cmd.top)
+        self.tops = [cmd.top for cmd in self.commands]
+        self.max_height = max([cmd.bottom - cmd.top for cmd in self.commands], default=0)
+
+def paint_objects(layout, commands):
+    """
+    InlineLayout.paint as it was: a DrawText per word.
+    """
+    if isinstance(layout, InlineLayout):
+        for x, y, word, font in layout.display_list:
+            commands.append(DrawText(x, y, word, font))
+    for child in layout.children:
+        paint_objects(child, commands)
+
+def paint_object_list(document):
+    commands = []
+    paint_objects(document, commands)
+    return ObjectDisplayList(commands)
+
+def measure(paint, document, repeat=3):
+    """
+    Return (best seconds, bytes allocated) of painting the document. The collector
+    stays on while timing: the passes it makes over the objects of an object
+    per command are part of the cost of painting them.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        paint(document)
+        best = min(best, time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    display_list = paint(document)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, size
+
+if __name__ == "__main__":
+    paragraphs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    set_font_backend("headless")
+    document = DocumentLayout(HTMLParser(text_page(paragraphs)).parse())
+    document.layout()
+
+    for name, paint in [("objects", paint_object_list), ("columns", paint_page)]:
+        seconds, size = measure(paint, document)
+        print("{:>8}: paint {:6.3f} s, {:6.1f} MB".format(name, seconds, size / 2**20))
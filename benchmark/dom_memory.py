@@ -0,0 +1,61 @@
+"""
+Bytes per html tree node (measured with tracemalloc) of the slotted Text and
+Element of response.response, against the plain classes they replaced and
+without interning the tag names.
+
+Run from the repository root:
+    python -m benchmark.dom_memory [size_in_mb]
+"""
+import gc, sys, tracemalloc, types
+
+from benchmark.parser import synthetic_page
+from data.connection import count_nodes
+from response.response import HTMLParser
+import response.response
+
+class PlainText:
+    """
+    Text before __slots__: a __dict__ and an empty children list per node.
+    """
+    def __init__(self, text, parent) -> None:
+        self.text = text
+        self.children = []
+        self.parent = parent
+
+class PlainElement:
+    """
+    Element before __slots__: a __dict__ and an attribute dictionary per node.
+    """
+    def __init__(self, tag, attributes, parent) -> None:
+        self.tag = tag
+        self.attributes = attributes or {}
+        self.children = []
+        self.parent = parent
+
+def tree_memory(body):
+    """
+    Return (bytes allocated for the tree of the body, its number of nodes).
+    """
+    gc.collect()
+    tracemalloc.start()
+    tree = HTMLParser(body).parse()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, count_nodes(tree)
+
+if __name__ == "__main__":
+    size = int(float(sys.argv[1]) * 1024 * 1024) if len(sys.argv) > 1 else 2 * 1024 * 1024
+    # Slices of a fresh string per run, so the text is measured the same both times.
+    body = synthetic_page(size)
+
+    slotted = response.response.Text, response.response.Element
+    response.response.Text, response.response.Element = PlainText, PlainElement
+    response.response.sys = types.SimpleNamespace(intern=lambda tag: tag)
+    before, nodes = tree_memory(body)
+    response.response.Text, response.response.Element = slotted
+    response.response.sys = sys
+    after, _ = tree_memory(body)
+
+    print("{} nodes".format(nodes))
+    print(" plain: {:8.1f} MB, {:6.1f} bytes per node".format(before / 2**20, before / nodes))
+    print("slotted: {:8.1f} MB, {:6.1f} bytes per node".format(after / 2**20, after / nodes))
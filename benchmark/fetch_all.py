@@ -0,0 +1,33 @@
+"""
+Throughput of transfer.transferutil.fetch_all against a local server that
+takes a fixed time to answer each request, for growing concurrency.
+
+Run from the repository root:
+    python -m benchmark.fetch_all [urls] [delay_ms]
+"""
+import asyncio, sys, time
+
+from benchmark.server import Fixture, FixtureServer
+from transfer.transferutil import fetch_all
+
+def slow_page(delay):
+    def fixture(handler):
+        time.sleep(delay)
+        return Fixture(b"<p>" + handler.path.encode() + b"</p>" * 1000)
+    return fixture
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 48
+    delay = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.05
+
+    routes = {"/page/{}".format(i): slow_page(delay) for i in range(count)}
+    server = FixtureServer(routes).start()
+    urls = [server.url(path) for path in routes]
+
+    for concurrency in [1, 4, 16, 48]:
+        start = time.perf_counter()
+        responses = asyncio.run(fetch_all(urls, concurrency))
+        elapsed = time.perf_counter() - start
+        assert all(response.get_status_code() == 200 for response in responses)
+        print("concurrency {:>2}: {:6.3f} s, {:6.1f} pages/s".format(concurrency, elapsed, count / elapsed))
+    server.shutdown()
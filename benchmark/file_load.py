@@ -0,0 +1,102 @@
+"""
+file:// loading: a large synthetic html file is loaded with the memory-mapped
+create_file_response and with the read-everything one it replaced, comparing the
+seconds, the peak Python memory and, with a parser, how soon the parser got its
+first piece of the page. Then a large directory is listed with and without the
+listing cache of transfer.transferutil.
+
+Run from the repository root:
+    python -m benchmark.file_load [size_in_mb] [files_in_directory]
+"""
+import gc, os, sys, tempfile, time, tracemalloc
+
+from benchmark.parser import synthetic_page
+from response.response import FileResponse, HTMLParser, create_file_response
+from url.url import get_url_components
+import transfer.transferutil as transferutil
+
+def read_file_response(stream, parser=None) -> FileResponse:
+    """
+    create_file_response before the files were mapped: read, decode, then parse.
+    Kept here only as the baseline of the benchmark.
+    """
+    body = stream.read().decode('utf8', errors='replace')
+    stream.close()
+    if parser is not None: parser.feed(body)
+    return FileResponse(body)
+
+def listdir_response(path) -> FileResponse:
+    """
+    The directory listing before the listing cache, also the baseline.
+    """
+    body = os.listdir(path).__str__()[1:-1]
+    return FileResponse(body.replace(", ", "\r\n"))
+
+class TimedParser(HTMLParser):
+    """
+    A parser that remembers when it was first fed.
+    """
+    def __init__(self) -> None:
+        HTMLParser.__init__(self)
+        self.first_feed = None
+
+    def feed(self, chunk):
+        if self.first_feed is None:
+            self.first_feed = time.perf_counter()
+        HTMLParser.feed(self, chunk)
+
+def measure(load, path, parser=None):
+    """
+    Return (seconds, seconds to the first feed) of load(open(path), parser).
+    """
+    gc.collect()
+    start = time.perf_counter()
+    load(open(path, 'rb'), parser)
+    seconds = time.perf_counter() - start
+    first = parser.first_feed - start if parser is not None else None
+    return seconds, first
+
+def peak_memory(load, path) -> float:
+    """
+    Return the peak MB Python allocated in load(open(path)). Traced separately
+    since tracing the allocations slows them down.
+    """
+    gc.collect()
+    tracemalloc.start()
+    load(open(path, 'rb'))
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return peak
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    files = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "page.html")
+        with open(path, "w") as f:
+            f.write(synthetic_page(size * 1024 * 1024))
+
+        for name, load in [("read", read_file_response), ("mmap", create_file_response)]:
+            seconds, _ = measure(load, path)
+            print("{:>4} {} MB, no parser: {:6.3f} s, peak {:6.1f} MB".format(
+                name, size, seconds, peak_memory(load, path)))
+        for name, load in [("read", read_file_response), ("mmap", create_file_response)]:
+            seconds, first = measure(load, path, TimedParser())
+            print("{:>4} {} MB, parser:    {:6.3f} s, first feed after {:7.4f} s".format(name, size, seconds, first))
+        os.remove(path)
+
+        for i in range(files):
+            open(os.path.join(directory, "file{:06}.txt".format(i)), "w").close()
+        components = get_url_components("file://" + directory)
+        loads = 20
+        start = time.perf_counter()
+        for _ in range(loads):
+            listdir_response(directory)
+        print("listdir {} entries:          {:7.2f} ms per listing".format(
+            files, (time.perf_counter() - start) / loads * 1000))
+        transferutil.DIRECTORY_LISTINGS.clear()
+        start = time.perf_counter()
+        for _ in range(loads):
+            transferutil._file_get(components)
+        print("scandir + cache {} entries:  {:7.2f} ms per listing (first one uncached)".format(
+            files, (time.perf_counter() - start) / loads * 1000))
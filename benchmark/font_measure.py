@@ -0,0 +1,78 @@
+"""
+Layout time of a large text page with the word widths and font metrics
+measured through Tk every time, against the MeasuredFont cache, cold (first
+page load) and warm (the page loaded again).
+
+The Tk fonts need a display (e.g. run under xvfb-run); the headless ones
+(see font.font) do not. Without a display, 'tcl' measures like the headless
+fonts but makes the round trip into a Tcl interpreter every tkinter.font.Font
+call makes: a lower bound of the Tk cost, without the text measuring of Tk
+itself. Run from the repository root:
+    python -m benchmark.font_measure [paragraphs] [tk|headless|tcl]
+"""
+import random, sys, time
+
+from browser import DocumentLayout, HTMLParser
+import font.font
+import tkinter
+
+WORDS = ("the of and to in is that for it as was with be by on not he this are or "
+         "browser layout cache parser request response socket canvas font measure").split()
+
+class TclRoundTripFont(font.font.HeadlessFont):
+    """
+    A headless font whose calls also go through Tcl, as Font.measure and
+    Font.metrics do with "font measure" and "font metrics".
+    """
+    def __init__(self, tcl, size, weight, slant) -> None:
+        super().__init__(size, weight, slant)
+        self.tcl = tcl
+
+    def measure(self, text):
+        self.tcl.call("string", "length", text)
+        return super().measure(text)
+
+    def metrics(self, name=None):
+        self.tcl.call("string", "length", name or "")
+        return super().metrics(name)
+
+class TclRoundTripBackend(font.font.FontBackend):
+    def __init__(self) -> None:
+        self.tcl = tkinter.Tcl()
+
+    def font(self, size, weight, slant):
+        return TclRoundTripFont(self.tcl, size, weight, slant)
+
+font.font.FONT_BACKENDS['tcl'] = TclRoundTripBackend
+
+def text_page(paragraphs):
+    rng = random.Random(0)
+    return "<html><body>" + "".join(
+        "<p>" + " ".join(rng.choice(WORDS) for _ in range(80)) + " <b>bold</b> <i>italic</i></p>"
+        for _ in range(paragraphs)) + "</body></html>"
+
+def layout_time(tokens):
+    start = time.perf_counter()
+    DocumentLayout(tokens).layout()
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    paragraphs = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    backend = sys.argv[2] if len(sys.argv) > 2 else "tk"
+    try:
+        root = tkinter.Tk() if backend == "tk" else None
+    except tkinter.TclError as e:
+        sys.exit("No display for the Tk fonts ({}): run under xvfb-run, or use 'tcl'.".format(e))
+    tokens = HTMLParser(text_page(paragraphs)).parse()
+
+    font.font.FONT_MEASURE_LIMIT = 0 # nothing is remembered: every call goes to the font
+    font.font.set_font_backend(backend)
+    print("    uncached: {:.3f} s".format(layout_time(tokens)))
+
+    font.font.FONT_MEASURE_LIMIT = 10000
+    font.font.set_font_backend(backend)
+    print("cached, cold: {:.3f} s".format(layout_time(tokens)))
+    print("cached, warm: {:.3f} s".format(layout_time(tokens)))
+    print("   hit ratio: {:.1%}".format(font.font.measure_hit_ratio()))
+    if root is not None:
+        root.destroy()
@@ -0,0 +1,74 @@
+"""
+Peak memory of create_http_response on a multi-MB gzip body served by a
+local server, compared against buffering the whole compressed body,
+decompressing it and then decoding it.
+
+Run from the repository root:
+    python -m benchmark.gzip_memory [size_in_mb]
+"""
+import gzip, random, socket, sys, time, tracemalloc, zlib
+
+from benchmark.server import Fixture, FixtureServer
+from response.response import create_http_response
+
+def buffered_response(stream):
+    """
+    The body handling create_http_response used before streaming decompression.
+    """
+    while stream.readline() != b"\r\n":
+        pass
+    body = stream.read()
+    return zlib.decompress(body, wbits=31).decode("utf8")
+
+def fetch(server, path, read):
+    """
+    Request 'path' and measure (seconds, peak traced bytes) of read(stream).
+    """
+    sock = socket.create_connection(server.server_address)
+    sock.sendall("GET {} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n".format(path).encode())
+    stream = sock.makefile("rb")
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    read(stream)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stream.close()
+    sock.close()
+    return elapsed, peak
+
+if __name__ == "__main__":
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 8
+    # Random words so the page compresses about as well as real text does.
+    random.seed(0)
+    words = ["".join(random.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(random.randint(2, 9)))
+             for _ in range(5000)]
+    lines = []
+    size = 0
+    while size < size_mb * 1024 * 1024:
+        line = "<p>" + " ".join(random.choices(words, k=12)) + "</p>\n"
+        lines.append(line)
+        size += len(line)
+    page = "".join(lines).encode()
+    del lines
+    compressed = gzip.compress(page)
+
+    server = FixtureServer({
+        "/gzip": Fixture(compressed, headers={"Content-Encoding": "gzip"}),
+        "/gzip-chunked": Fixture(compressed, headers={"Content-Encoding": "gzip"}, chunked=True),
+        "/deflate": Fixture(zlib.compress(page), headers={"Content-Encoding": "deflate"}),
+    }).start()
+
+    print("page: {:.1f} MB, gzip: {:.2f} MB".format(len(page) / 2**20, len(compressed) / 2**20))
+    runs = [
+        ("buffered, content-length", "/gzip", buffered_response),
+        ("streaming, content-length", "/gzip", create_http_response),
+        ("streaming, chunked", "/gzip-chunked", create_http_response),
+        ("streaming, deflate", "/deflate", create_http_response),
+    ]
+    for name, path, read in runs:
+        elapsed, peak = fetch(server, path, read)
+        print("{:>26}: {:6.3f} s, peak {:6.1f} MB".format(name, elapsed, peak / 2**20))
+    server.shutdown()
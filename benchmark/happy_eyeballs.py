@@ -0,0 +1,92 @@
+"""
+Connection setup through transfer.resolver: a stub resolver answers the host
+name "dual.test" (slowly, like a real DNS lookup) with a dead address first and
+then fixture servers on ::1 and 127.0.0.1. Shows the cost of the lookups with
+and without the resolver cache, and that the dead address only delays the
+connect by the Happy Eyeballs attempt delay instead of a connect timeout.
+
+Run from the repository root:
+    python -m benchmark.happy_eyeballs [loads]
+"""
+import socket, sys, time
+
+from benchmark.server import Fixture, FixtureServer
+from transfer.resolver import Resolver, CONNECT_ATTEMPT_DELAY
+from transfer.socketutil import CONNECTION_POOL
+import transfer.socketutil as socketutil
+import transfer.transferutil as transferutil
+
+DNS_LATENCY = 0.05
+
+def blackhole():
+    """
+    Return a listening socket whose accept queue is full, so connecting to it
+    hangs like connecting to a dead host, and the sockets filling the queue.
+    """
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(0)
+    fillers = []
+    for _ in range(3):
+        filler = socket.socket()
+        filler.setblocking(False)
+        filler.connect_ex(listener.getsockname())
+        fillers.append(filler)
+    time.sleep(0.1)
+    return listener, fillers
+
+class StubResolver:
+    """
+    A getaddrinfo answering 'names' (host -> [sockaddr]) after DNS_LATENCY seconds.
+    """
+    def __init__(self, names) -> None:
+        self.names = names
+        self.calls = 0
+
+    def __call__(self, host, port, family=0, type=0):
+        self.calls += 1
+        time.sleep(DNS_LATENCY)
+        if host not in self.names:
+            raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+        return [(socket.AF_INET6 if ":" in address[0] else socket.AF_INET, socket.SOCK_STREAM,
+                 socket.IPPROTO_TCP, "", address) for address in self.names[host]]
+
+def load_all(url, loads):
+    """
+    Get the url 'loads' times over new connections and return the seconds per load.
+    """
+    start = time.perf_counter()
+    for _ in range(loads):
+        transferutil.get(url)
+        CONNECTION_POOL.close()
+    return (time.perf_counter() - start) / loads
+
+if __name__ == "__main__":
+    loads = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    routes = {"/": Fixture(b"<p>hello</p>", headers={"Cache-Control": "no-store"})}
+    v4 = FixtureServer(routes).start()
+    port = v4.server_address[1]
+    v6 = FixtureServer(routes, port=port, host="::1").start()
+    listener, fillers = blackhole()
+    dead = listener.getsockname()
+    url = "http://dual.test:{}/".format(port)
+
+    cases = [
+        ("v6 + v4, no cache", [("::1", port, 0, 0), ("127.0.0.1", port)], 0),
+        ("v6 + v4, cached", [("::1", port, 0, 0), ("127.0.0.1", port)], 60),
+        ("dead first, cached", [dead, ("::1", port, 0, 0), ("127.0.0.1", port)], 60),
+    ]
+    for name, addresses, ttl in cases:
+        stub = StubResolver({"dual.test": addresses})
+        socketutil.RESOLVER = Resolver(ttl=ttl, getaddrinfo=stub)
+        per_load = load_all(url, loads)
+        print("{:>19}: {:7.2f} ms per load, {} lookups; v6 server {} hits, v4 server {} hits".format(
+            name, per_load * 1000, stub.calls, v6.hits.get("/", 0), v4.hits.get("/", 0)))
+        v4.hits.clear()
+        v6.hits.clear()
+    print("(attempt delay {:.0f} ms, DNS latency {:.0f} ms)".format(CONNECT_ATTEMPT_DELAY * 1000, DNS_LATENCY * 1000))
+
+    for sock in fillers + [listener]:
+        sock.close()
+    v4.shutdown()
+    v6.shutdown()
@@ -0,0 +1,140 @@
+"""
+A stand-in for the parts of tkinter Browser uses, so the UI benchmarks can run
+where there is no display. Nothing is drawn: the canvas keeps its items in a
+dictionary and counts the calls made on it, and the window runs its 'after'
+callbacks when update is called, like one pass of the Tk event loop.
+
+The time Tk itself spends (drawing the items, talking to the X server) is not
+in what is measured with it, so compare the canvas calls (Canvas.calls) as well
+as the times. Use it before making the Browser:
+    with headless_tk():
+        b = Browser()
+"""
+import contextlib, heapq, itertools, sys, time
+from collections import Counter
+
+import browser
+import font.font
+
+X, Y, BOTH, NO, YES, LEFT, RIGHT, W = "x", "y", "both", 0, 1, "left", "right", "w"
+
+class Widget:
+    def __init__(self, master=None, **options) -> None:
+        self.master = master
+        self.options = options
+        self.bindings = {}
+
+    def pack(self, **options):
+        pass
+
+    def bind(self, sequence, func):
+        self.bindings[sequence] = func
+
+    def configure(self, **options):
+        self.options.update(options)
+
+Frame = Label = Entry = Button = Widget
+
+class Tk(Widget):
+    """
+    The window: 'after' callbacks are kept in a heap by the time they are due.
+    """
+    def __init__(self) -> None:
+        super().__init__()
+        self.timers = [] # (due, job, func, args)
+        self.cancelled = set()
+        self.jobs = itertools.count()
+
+    def title(self, text):
+        self.options['title'] = text
+
+    def after(self, ms, func, *args):
+        job = next(self.jobs)
+        heapq.heappush(self.timers, (time.perf_counter() + ms / 1000, job, func, args))
+        return job
+
+    def after_cancel(self, job):
+        self.cancelled.add(job)
+
+    def update(self):
+        """
+        Run the callbacks that are due.
+        """
+        now = time.perf_counter()
+        while self.timers and self.timers[0][0] <= now:
+            _, job, func, args = heapq.heappop(self.timers)
+            if job in self.cancelled:
+                self.cancelled.discard(job)
+                continue
+            func(*args)
+
+    def update_idletasks(self):
+        pass
+
+    def destroy(self):
+        self.timers = []
+
+class StringVar:
+    def __init__(self, value="") -> None:
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+class Canvas(Widget):
+    """
+    Keeps the coordinates of its items, by id, and counts the calls by name.
+    Like Tk, moving or deleting "all" visits every item.
+    """
+    def __init__(self, master=None, **options) -> None:
+        super().__init__(master, **options)
+        self.items = {}
+        self.ids = itertools.count(1)
+        self.calls = Counter()
+
+    def create_text(self, x, y, **options):
+        self.calls['create_text'] += 1
+        return self._create([x, y])
+
+    def create_rectangle(self, x1, y1, x2, y2, **options):
+        self.calls['create_rectangle'] += 1
+        return self._create([x1, y1, x2, y2])
+
+    def delete(self, item):
+        self.calls['delete'] += 1
+        if item == "all":
+            self.items.clear()
+        else:
+            self.items.pop(item, None)
+
+    def move(self, item, dx, dy):
+        self.calls['move'] += 1
+        for coords in (self.items.values() if item == "all" else [self.items[item]]):
+            for i in range(0, len(coords), 2):
+                coords[i] += dx
+                coords[i + 1] += dy
+
+    def tag_lower(self, item):
+        self.calls['tag_lower'] += 1
+
+    def _create(self, coords):
+        item = next(self.ids)
+        self.items[item] = coords
+        return item
+
+@contextlib.contextmanager
+def headless_tk():
+    """
+    Make Browser use this module instead of tkinter, and the headless fonts.
+    """
+    tkinter = browser.tkinter
+    browser.tkinter = sys.modules[__name__]
+    font.font.set_font_backend("headless")
+    try:
+        yield
+    finally:
+        browser.tkinter = tkinter
+        font.font.set_font_backend("tk")
@@ -0,0 +1,71 @@
+"""
+Tokens/second of response.response.HTMLParser on a large synthetic page,
+compared against the old character-by-character tokenizer.
+
+Run from the repository root:
+    python -m benchmark.parser [size_in_mb]
+"""
+import gc, sys, time
+
+from response.response import HTMLParser
+
+class CharByCharParser(HTMLParser):
+    """
+    The tokenizer HTMLParser.parse used before the slice-based scan.
+    Kept here only as the baseline of the benchmark.
+    """
+    def parse(self):
+        text = ""
+        in_tag = False
+        for c in self.body:
+            if c == "<":
+                in_tag = True
+                if text: self._add_text(text)
+                text = ""
+            elif c == ">":
+                in_tag = False
+                self._add_tag(text)
+                text = ""
+            else:
+                text += c
+        if not in_tag and text:
+            self._add_text(text)
+        return self._finish()
+
+def synthetic_page(size):
+    """
+    Return an html page of roughly 'size' characters made of paragraphs,
+    inline tags, self-closing tags and comments.
+    """
+    block = "<div class=\"item\"><p>Lorem <b>ipsum</b> dolor sit <i>amet</i>, " \
+            "consectetur adipiscing elit.<br>Sed do <small>eiusmod</small> tempor." \
+            "</p><!-- comment --><img src=\"a.png\"></div>\n"
+    return "<!doctype html><title>bench</title>" + block * (size // len(block) + 1)
+
+def count_tokens(body):
+    return body.count("<") + body.count(">")
+
+def run(parser_class, body, repeat=3):
+    """
+    Best of 'repeat' parses. The collector is paused while timing so that
+    the garbage of the previous tree does not end up in the measurement.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        start = time.perf_counter()
+        parser_class(body).parse()
+        best = min(best, time.perf_counter() - start)
+        gc.enable()
+    return best
+
+if __name__ == "__main__":
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    body = synthetic_page(int(size_mb * 1024 * 1024))
+    tokens = count_tokens(body)
+
+    print("page: {:.1f} MB, {} tokens".format(len(body) / 1024 / 1024, tokens))
+    for name, parser_class in [("char-by-char", CharByCharParser), ("slice-based", HTMLParser)]:
+        elapsed = run(parser_class, body)
+        print("{:>13}: {:7.3f} s {:12.0f} tokens/s".format(name, elapsed, tokens / elapsed))
@@ -0,0 +1,77 @@
+"""
+Round trips of loading pages behind redirect chains from a local server, with and
+without the cache of redirects in transfer.transferutil. Every chain is three hops
+(a 301 with an absolute location, a 308 with a relative one and a 302 that is fresh
+for a while) to a no-store page, so the page itself is fetched on every load and
+only the hops can be saved. Also loads a redirect loop, and a chain whose 302
+expires between two loads.
+
+Run from the repository root:
+    python -m benchmark.redirects [chains] [loads]
+"""
+import sys, time
+
+from benchmark.server import Fixture, FixtureServer
+import transfer.transferutil as transferutil
+
+BODY = b"<p>Lorem ipsum <b>dolor</b> sit amet.</p>\n" * 100
+
+def redirect(status, location, cache_control=None):
+    headers = {"Location": location, "Content-Length": "0"}
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    return Fixture(status=status, headers=headers)
+
+def chain_routes(server_url, chain, temporary_max_age=600) -> dict:
+    prefix = "/chain/{}/".format(chain)
+    return {
+        prefix + "start": redirect(301, server_url(prefix + "moved")),
+        prefix + "moved": redirect(308, "../{}/current".format(chain)),
+        prefix + "current": redirect(302, "page", "max-age={}".format(temporary_max_age)),
+        prefix + "page": Fixture(BODY, headers={"Cache-Control": "no-store"}),
+    }
+
+def load(server, paths, loads) -> tuple:
+    """
+    Get every path 'loads' times and return (seconds, network requests).
+    """
+    hits_before = sum(server.hits.values())
+    start = time.perf_counter()
+    for _ in range(loads):
+        for path in paths:
+            transferutil.get(server.url(path))
+    return time.perf_counter() - start, sum(server.hits.values()) - hits_before
+
+if __name__ == "__main__":
+    chains = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    loads = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    server = FixtureServer({}).start()
+    for chain in range(chains):
+        server.routes.update(chain_routes(server.url, chain))
+    server.routes.update(chain_routes(server.url, "short", temporary_max_age=1))
+    server.routes["/loop/a"] = redirect(301, "/loop/b")
+    server.routes["/loop/b"] = redirect(301, "/loop/a")
+    paths = ["/chain/{}/start".format(chain) for chain in range(chains)]
+
+    remember_redirect = transferutil._remember_redirect
+    for name, remember in [("network hops", lambda value, location: None),
+                           ("redirect cache", remember_redirect)]:
+        transferutil.CENTRAL_CACHE = transferutil.Cache()
+        transferutil._remember_redirect = remember
+        seconds, requests = load(server, paths, loads)
+        print("{:>14}: {:6.3f} s, {:4} network requests for {} loads of {} chains ({} hops from the cache)".format(
+            name, seconds, requests, loads, chains, transferutil.CENTRAL_CACHE.redirect_hops))
+
+        _, requests = load(server, ["/loop/a"], 2)
+        print("{:>14}  loop a -> b -> a, 2 loads: {} network requests".format("", requests))
+    transferutil._remember_redirect = remember_redirect
+
+    _, first = load(server, ["/chain/short/start"], 1)
+    _, fresh = load(server, ["/chain/short/start"], 1)
+    time.sleep(1.5)
+    _, expired = load(server, ["/chain/short/start"], 1)
+    print("302 fresh for 1 s: {} network requests, then {} while fresh, {} once it expired".format(
+        first, fresh, expired))
+
+    transferutil.CONNECTION_POOL.close()
+    server.shutdown()
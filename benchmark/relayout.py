@@ -0,0 +1,57 @@
+"""
+Time per window resize of a long page: Browser._relayout, which lays out the
+existing layout tree again from its cached word measurements, against building
+and laying out a new DocumentLayout from the tokens like a resize did before.
+
+Tk needs a display (e.g. run under xvfb-run); with 'headless' the canvas is the
+stand-in of benchmark.headless_tk and the fonts are the headless ones. Run from
+the repository root:
+    python -m benchmark.relayout [lines] [tk|headless]
+"""
+import contextlib, sys, time
+
+from benchmark.headless_tk import headless_tk
+
+from browser import Browser, DocumentLayout, HTMLParser, paint_page
+import browser
+
+def rebuild(b):
+    """
+    The relayout Browser._canvas_resize did before the layout tree was reused.
+    """
+    b.document = DocumentLayout(b.tokens)
+    b.document.layout()
+    b.canvas_layout = paint_page(b.document)
+    b._clear_canvas()
+    b._draw()
+
+def resize_through(b, relayout, widths):
+    """
+    Lay the page out for each of the widths and return the times in seconds.
+    """
+    times = []
+    for width in widths:
+        browser.WIDTH = width
+        start = time.perf_counter()
+        relayout(b)
+        b.window.update_idletasks()
+        times.append(time.perf_counter() - start)
+    return times
+
+if __name__ == "__main__":
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    page = "<html><body>" + "".join("<p>Line {} of the page with <b>some</b> words.</p>".format(i)
+                                    for i in range(lines)) + "</body></html>"
+    headless = len(sys.argv) > 2 and sys.argv[2] == "headless"
+    with headless_tk() if headless else contextlib.nullcontext():
+        b = Browser()
+        b.window.update()
+        b.tokens = HTMLParser(page).parse()
+        b._fill_canvas_layout()
+
+        widths = [400 + 10 * i for i in range(30)]
+        for name, relayout in [("rebuild tree", rebuild), ("reuse tree", Browser._relayout)]:
+            times = sorted(resize_through(b, relayout, widths))
+            print("{:>12}: mean {:7.2f} ms, max {:7.2f} ms per resize".format(
+                name, sum(times) / len(times) * 1000, times[-1] * 1000))
+        b.window.destroy()
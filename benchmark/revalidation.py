@@ -0,0 +1,50 @@
+"""
+Bytes downloaded and load time of repeated page loads when the cached copy
+expires immediately: a page without validators is downloaded in full every
+time, a page with an ETag is revalidated and answered with 304 Not Modified.
+
+Run from the repository root:
+    python -m benchmark.revalidation [loads] [size_kb]
+"""
+import sys, tempfile, time
+
+from benchmark.server import Fixture, FixtureServer
+from transfer.diskcache import DiskCache
+import transfer.transferutil as transferutil
+
+class Page:
+    """
+    A page route that counts the body bytes it sends.
+    """
+    def __init__(self, body, etag=None) -> None:
+        self.body = body
+        self.etag = etag
+        self.sent = 0
+
+    def __call__(self, handler):
+        if self.etag is not None and handler.headers.get("If-None-Match") == self.etag:
+            return Fixture(status=304, headers={"ETag": self.etag})
+        self.sent += len(self.body)
+        headers = {"Cache-Control": "max-age=0"}
+        if self.etag is not None:
+            headers["ETag"] = self.etag
+        return Fixture(self.body, headers=headers)
+
+if __name__ == "__main__":
+    loads = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    size = int(sys.argv[2]) * 1024 if len(sys.argv) > 2 else 1024 * 1024
+    body = (b"<p>Lorem ipsum <b>dolor</b> sit amet.</p>\n" * (size // 42 + 1))[:size]
+
+    pages = {"/plain": Page(body), "/etag": Page(body, etag='"v1"')}
+    server = FixtureServer(pages).start()
+
+    with tempfile.TemporaryDirectory() as directory:
+        transferutil.CENTRAL_CACHE = transferutil.Cache(disk=DiskCache(directory))
+        for path, page in pages.items():
+            start = time.perf_counter()
+            for _ in range(loads):
+                transferutil.get(server.url(path))
+            elapsed = time.perf_counter() - start
+            print("{:>7}: {:6.3f} s for {} loads, {:8.1f} KB downloaded".format(
+                path, elapsed, loads, page.sent / 1024))
+    server.shutdown()
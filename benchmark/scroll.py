@@ -0,0 +1,67 @@
+"""
+Frame time of scrolling through a 10k-line page: Browser._draw, which only
+visits the commands in the viewport and moves the items already drawn,
+against deleting everything and scanning the whole display list per frame.
+
+Tk needs a display (e.g. run under xvfb-run); with 'headless' the canvas is the
+stand-in of benchmark.headless_tk, which draws nothing, so the canvas calls per
+frame are shown as well. Run from the repository root:
+    python -m benchmark.scroll [lines] [tk|headless]
+"""
+import contextlib, sys, time
+
+from benchmark.headless_tk import headless_tk
+
+from browser import Browser, HTMLParser, SCROLL_STEP
+import browser
+
+def redraw_everything(b):
+    """
+    The drawing Browser._draw did before it became incremental.
+    """
+    b.canvas.delete("all")
+    display_list = b.canvas_layout
+    for i in range(len(display_list)):
+        if display_list.tops[i] > b.scroll + browser.HEIGHT: continue
+        if display_list.bottoms[i] < b.scroll: continue
+        display_list.execute(i, b.scroll, b.canvas)
+
+def scroll_through(b, draw, frames):
+    """
+    Scroll down 'frames' steps and return the frame times in seconds.
+    The canvas calls of the frames are counted in 'calls' of the headless canvas.
+    """
+    b.scroll = 0
+    b._clear_canvas()
+    b._draw()
+    if hasattr(b.canvas, 'calls'):
+        b.canvas.calls.clear()
+    times = []
+    for _ in range(frames):
+        b.scroll += SCROLL_STEP
+        start = time.perf_counter()
+        draw(b)
+        b.window.update_idletasks()
+        times.append(time.perf_counter() - start)
+    return times
+
+if __name__ == "__main__":
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    page = "<html><body>" + "".join("<p>Line {} of the page with <b>some</b> words.</p>".format(i)
+                                    for i in range(lines)) + "</body></html>"
+    headless = len(sys.argv) > 2 and sys.argv[2] == "headless"
+    with headless_tk() if headless else contextlib.nullcontext():
+        b = Browser()
+        b.window.update()
+        b.tokens = HTMLParser(page).parse()
+        b._fill_canvas_layout()
+
+        frames = 300
+        for name, draw in [("redraw everything", redraw_everything), ("incremental", Browser._draw)]:
+            times = sorted(scroll_through(b, draw, frames))
+            print("{:>17}: mean {:6.2f} ms, p95 {:6.2f} ms per frame ({} commands)".format(
+                name, sum(times) / frames * 1000, times[int(frames * 0.95)] * 1000, len(b.canvas_layout)))
+            if headless:
+                print("{:>17}  canvas calls per frame: {}".format("", ", ".join(
+                    "{} {:.1f}".format(call, count / frames) for call, count in sorted(b.canvas.calls.items()))))
+        b.window.destroy()
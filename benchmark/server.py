@@ -0,0 +1,79 @@
+"""
+A local HTTP fixture server for the benchmarks.
+
+Each route is a path mapped to a Fixture (status, headers and body). Bodies
+can be served with a content-length or chunked, and the server speaks
+HTTP/1.1 so connections are kept alive unless the client asks otherwise.
+The number of requests per path is counted in 'hits'.
+"""
+import http.server, socket, ssl, threading
+
+class Fixture:
+    def __init__(self, body: bytes = b"", status=200, headers: dict = None, chunked=False) -> None:
+        self.body = body
+        self.status = status
+        self.headers = headers or {}
+        self.chunked = chunked
+
+CHUNK_SIZE = 16 * 1024
+
+class FixtureHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True # no 40 ms delayed-ACK stalls between the headers and the body
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+        fixture = server.routes.get(self.path)
+        if fixture is None:
+            fixture = Fixture(b"not found", status=404)
+        if callable(fixture):
+            fixture = fixture(self)
+
+        self.send_response(fixture.status)
+        for header, value in fixture.headers.items():
+            self.send_header(header, value)
+        if fixture.chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i in range(0, len(fixture.body), CHUNK_SIZE):
+                chunk = fixture.body[i:i + CHUNK_SIZE]
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self.send_header("Content-Length", str(len(fixture.body)))
+            self.end_headers()
+            self.wfile.write(fixture.body)
+
+class FixtureServer(http.server.ThreadingHTTPServer):
+    """
+    Serve 'routes' on 'host' (127.0.0.1 by default, or an IPv6 address like ::1)
+    from a daemon thread. A route may also be a function of the request handler
+    returning a Fixture, for responses that depend on the request headers. Given
+    a server-side SSL context, the server speaks https instead.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, routes: dict, port=0, context: ssl.SSLContext = None, host="127.0.0.1") -> None:
+        self.address_family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        self.host = host
+        http.server.ThreadingHTTPServer.__init__(self, (host, port), FixtureHandler)
+        if context is not None:
+            self.socket = context.wrap_socket(self.socket, server_side=True)
+        self.scheme = "http" if context is None else "https"
+        self.routes = routes
+        self.hits = {}
+        self.lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def url(self, path: str) -> str:
+        host = "[" + self.host + "]" if ":" in self.host else self.host
+        return "{}://{}:{}{}".format(self.scheme, host, self.server_address[1], path)
@@ -0,0 +1,107 @@
+"""
+Stress test of the browser cache under concurrent use, against a local
+fixture server that counts the requests it gets:
+
+1. Many threads get the same slow page at once. With single-flight they share
+   one fetch; calling _cache_miss_get directly shows what they did without it.
+2. Many threads hammer a set of pages through a cache small enough to evict
+   all the time, then the cache bookkeeping is checked for consistency.
+
+Exits with 1 if a check fails. Run from the repository root:
+    python -m benchmark.single_flight [threads]
+"""
+import random, sys, tempfile, threading, time
+
+from benchmark.server import Fixture, FixtureServer
+from transfer.diskcache import DiskCache
+from transfer.socketutil import CONNECTION_POOL
+import transfer.transferutil as transferutil
+
+BODY = b"<p>Lorem ipsum <b>dolor</b> sit amet.</p>\n" * 200
+
+def slow_page(handler):
+    time.sleep(0.2) # long enough for all the threads to miss at once
+    return Fixture(BODY, headers={"Cache-Control": "max-age=60"})
+
+def run_threads(count, target):
+    """
+    Start 'count' threads running target(i) together and return their results.
+    """
+    results = [None] * count
+    barrier = threading.Barrier(count)
+
+    def run(i):
+        barrier.wait()
+        results[i] = target(i)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def check_cache(cache) -> list:
+    """
+    Return the inconsistencies between the map, the counters and the LRU list.
+    """
+    problems = []
+    if cache.count != len(cache.map):
+        problems.append("count {} != {} keys".format(cache.count, len(cache.map)))
+    if cache.size != sum(node.size for node in cache.map.values()):
+        problems.append("size does not match the nodes")
+    if cache.size > cache.max_bytes:
+        problems.append("over budget")
+    listed, node = 0, cache.policy.head.next
+    while node is not cache.policy.tail and listed <= cache.count:
+        listed, node = listed + 1, node.next
+    if listed != cache.count:
+        problems.append("LRU list has {} nodes for {} keys".format(listed, cache.count))
+    return problems
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    routes = {"/slow": slow_page, "/slow-uncached": slow_page}
+    for i in range(50):
+        headers = {"Cache-Control": "max-age=60" if i % 2 else "no-store"}
+        routes["/page/{}".format(i)] = Fixture(BODY, headers=headers)
+    server = FixtureServer(routes).start()
+    failed = False
+
+    with tempfile.TemporaryDirectory() as directory:
+        transferutil.CENTRAL_CACHE = transferutil.Cache(disk=DiskCache(directory))
+        url = server.url("/slow")
+        responses = run_threads(count, lambda i: transferutil.get(url))
+        uncached = server.url("/slow-uncached")
+        run_threads(count, lambda i: transferutil._cache_miss_get(uncached))
+
+    shared = len({id(response) for response in responses}) == 1
+    print("same page, {} threads: {} upstream request(s) with single-flight, "
+          "{} without; one shared response: {}".format(
+              count, server.hits["/slow"], server.hits["/slow-uncached"], shared))
+    failed |= server.hits["/slow"] != 1 or not shared
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Room for about ten pages, so the threads keep evicting each other's.
+        cache = transferutil.Cache(max_bytes=10 * len(BODY), disk=DiskCache(directory))
+        transferutil.CENTRAL_CACHE = cache
+        paths = ["/page/{}".format(i) for i in range(50)]
+
+        def hammer(i):
+            rng = random.Random(i)
+            for _ in range(100):
+                transferutil.get(server.url(rng.choice(paths)))
+
+        start = time.perf_counter()
+        run_threads(count, hammer)
+        elapsed = time.perf_counter() - start
+
+    upstream = sum(server.hits.get(path, 0) for path in paths)
+    problems = check_cache(cache)
+    print("hammer, {} threads x 100 gets: {:.2f} s, {} upstream requests, hit ratio {:.1%}, {}".format(
+        count, elapsed, upstream, cache.hit_ratio(), "; ".join(problems) or "cache consistent"))
+    failed |= bool(problems)
+
+    CONNECTION_POOL.close()
+    server.shutdown()
+    sys.exit(1 if failed else 0)
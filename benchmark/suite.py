@@ -0,0 +1,212 @@
+"""
+The end-to-end benchmark suite: fixture pages (small, 1 MB, 10 MB, deeply nested,
+chunked and gzip) are served over http and https by a local FixtureServer, and
+every stage of loading them is timed on its own:
+
+    get                 : transfer.transferutil.get, from the network (no-store pages)
+    create_http_response: the response parsed from its raw bytes in memory
+    parse               : HTMLParser.parse of the decoded body
+    layout              : DocumentLayout.layout with the headless fonts
+    paint               : browser.paint_page
+
+The results (best and median seconds of every fixture/stage) are written as JSON.
+Given a baseline (the JSON of an earlier run), the medians are compared with it and
+the run fails if a stage got slower than the threshold. Timings only compare on
+the same machine, so baselines are not committed: --save-baseline records one in
+BASELINE (.benchmarks/ at the repository root, ignored by git) and --compare
+compares with it.
+
+Run from the repository root:
+    python -m benchmark.suite [-r REPEAT] [-k FILTER] [-o results.json]
+                              [--baseline baseline.json | --compare | --save-baseline]
+                              [--threshold 0.1]
+"""
+from io import BufferedReader, BytesIO
+import argparse, gc, gzip, json, os, platform, ssl, statistics, sys, tempfile, time
+
+from benchmark.parser import synthetic_page
+from benchmark.server import Fixture, FixtureServer, CHUNK_SIZE
+from benchmark.tls_handshake import make_certificate
+from transfer.socketutil import CONNECTION_POOL, get_ssl_context
+from transfer.transferutil import get
+from response.response import HTMLParser, create_http_response
+from font.font import set_font_backend
+import browser
+
+MB = 1024 * 1024
+BASELINE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        ".benchmarks", "baseline.json")
+NO_STORE = {"Content-Type": "text/html; charset=utf-8", "Cache-Control": "no-store"}
+
+def nested_page(depth):
+    return "<html><body>" + "<div>" * depth + "<p>deep <b>text</b></p>" + "</div>" * depth + "</body></html>"
+
+def fixtures() -> dict:
+    """
+    The fixture pages by name. Every page is sent with no-store so get
+    always goes to the network.
+    """
+    body_1mb = synthetic_page(MB).encode("utf8")
+    return {
+        "small": Fixture(synthetic_page(2 * 1024).encode("utf8"), headers=NO_STORE),
+        "1mb": Fixture(body_1mb, headers=NO_STORE),
+        "10mb": Fixture(synthetic_page(10 * MB).encode("utf8"), headers=NO_STORE),
+        # Deep enough to stress the tree, shallow enough for the recursive layout.
+        "nested": Fixture(nested_page(300).encode("utf8"), headers=NO_STORE),
+        "chunked": Fixture(body_1mb, headers=NO_STORE, chunked=True),
+        "gzip": Fixture(gzip.compress(body_1mb), headers=dict(NO_STORE, **{"Content-Encoding": "gzip"})),
+    }
+
+def raw_response(fixture: Fixture) -> bytes:
+    """
+    The bytes of the response the fixture server sends for the fixture.
+    """
+    head = "HTTP/1.1 {} OK\r\n".format(fixture.status)
+    for header, value in fixture.headers.items():
+        head += "{}: {}\r\n".format(header, value)
+    if fixture.chunked:
+        body = b"".join(b"%x\r\n%s\r\n" % (len(fixture.body[i:i + CHUNK_SIZE]), fixture.body[i:i + CHUNK_SIZE])
+                        for i in range(0, len(fixture.body), CHUNK_SIZE)) + b"0\r\n\r\n"
+        head += "Transfer-Encoding: chunked\r\n"
+    else:
+        body = fixture.body
+        head += "Content-Length: {}\r\n".format(len(body))
+    return (head + "\r\n").encode("latin-1") + body
+
+def timed(function, repeat, setup=None) -> list:
+    """
+    Return the seconds of 'repeat' calls of function(setup()). The collector is
+    paused while timing so the garbage of the previous call is not measured.
+    """
+    times = []
+    for _ in range(repeat):
+        argument = setup() if setup else None
+        gc.collect()
+        gc.disable()
+        start = time.perf_counter()
+        function(argument)
+        times.append(time.perf_counter() - start)
+        gc.enable()
+    return times
+
+def bench_fixture(name, fixture, servers, repeat) -> dict:
+    """
+    Time every stage of the fixture and return {stage: seconds of every repeat}.
+    """
+    results = {}
+    for server in servers:
+        url = server.url("/" + name)
+        results["get/" + server.scheme] = timed(lambda _: get(url), repeat)
+
+    raw = raw_response(fixture)
+    results["create_http_response"] = timed(
+        create_http_response, repeat, setup=lambda: BufferedReader(BytesIO(raw)))
+
+    body = create_http_response(BufferedReader(BytesIO(raw))).get_raw_body()
+    results["parse"] = timed(lambda _: HTMLParser(body).parse(), repeat)
+
+    tokens = HTMLParser(body).parse()
+    results["layout"] = timed(lambda document: document.layout(), repeat,
+                              setup=lambda: browser.DocumentLayout(tokens))
+
+    document = browser.DocumentLayout(tokens)
+    document.layout()
+    results["paint"] = timed(lambda _: browser.paint_page(document), repeat)
+    return results
+
+"""
+A stage has to get slower by at least this many seconds to count as a regression:
+the medians of the sub-millisecond stages vary more than any threshold between runs.
+"""
+MIN_REGRESSION = 0.001
+
+def compare(results, baseline, threshold) -> list:
+    """
+    Return the (key, baseline median, median) of the benchmarks whose median is
+    more than 'threshold' (a fraction) and MIN_REGRESSION slower than in the baseline.
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        before = baseline[key]["median"]
+        if result["median"] > before * (1 + threshold) and result["median"] - before > MIN_REGRESSION:
+            regressions.append((key, before, result["median"]))
+    return regressions
+
+def start_servers(routes, directory):
+    """
+    Start an http and an https fixture server for the routes. The certificate of
+    the https one is trusted by the browser's shared SSL context for the run.
+    """
+    cert, key = make_certificate(directory)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    get_ssl_context().load_verify_locations(cert)
+    return [FixtureServer(routes).start(), FixtureServer(routes, context=context).start()]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time every stage of loading the fixture pages.")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="runs of every benchmark")
+    parser.add_argument("-k", "--filter", default="", help="only the fixtures whose name contains this")
+    parser.add_argument("-o", "--output", help="file to write the JSON results to")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--compare", action="store_true", help="compare with the baseline saved in " + BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to " + BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="slowdown of a median over the baseline counted as a regression")
+    args = parser.parse_args(argv)
+    if args.compare:
+        args.baseline = BASELINE
+    if args.save_baseline:
+        args.output = BASELINE
+    baseline = None
+    if args.baseline: # read before --save-baseline may replace it
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)["results"]
+        except FileNotFoundError:
+            parser.error("no baseline at {}; record one first with --save-baseline".format(args.baseline))
+
+    set_font_backend("headless")
+    routes = {"/" + name: fixture for name, fixture in fixtures().items()}
+    with tempfile.TemporaryDirectory() as directory:
+        servers = start_servers(routes, directory)
+
+    results = {}
+    try:
+        for path, fixture in routes.items():
+            name = path[1:]
+            if args.filter not in name:
+                continue
+            stages = bench_fixture(name, fixture, servers, args.repeat)
+            for stage, times in stages.items():
+                key = name + "/" + stage
+                results[key] = {"best": min(times), "median": statistics.median(times)}
+                print("{:>32}: best {:9.4f} s, median {:9.4f} s".format(key, min(times), statistics.median(times)))
+    finally:
+        CONNECTION_POOL.close()
+        for server in servers:
+            server.shutdown()
+
+    report = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                 "repeat": args.repeat, "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for key, before, after in regressions:
+            print("REGRESSION {}: median {:.4f} s -> {:.4f} s ({:+.0%})".format(key, before, after, after / before - 1))
+        if regressions:
+            return 1
+        print("No regression over {:.0%} against {}".format(args.threshold, args.baseline))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
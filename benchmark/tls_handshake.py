@@ -0,0 +1,66 @@
+"""
+Handshake latency of https connections to a local self-signed TLS server,
+with and without TLS session resumption.
+
+A throwaway certificate for 127.0.0.1 is made with the openssl command and
+trusted by the browser's shared SSL context for the run.
+
+Run from the repository root:
+    python -m benchmark.tls_handshake [connections]
+"""
+import os, ssl, subprocess, sys, tempfile, time
+
+from benchmark.server import Fixture, FixtureServer
+from transfer.socketutil import Socket, TLS_SESSIONS, get_ssl_context
+from url.url import get_url_components
+
+def make_certificate(directory):
+    """
+    Create a self-signed certificate and key for 127.0.0.1 and return their paths.
+    """
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+                    "-keyout", key, "-out", cert, "-days", "1", "-subj", "/CN=127.0.0.1",
+                    "-addext", "subjectAltName=IP:127.0.0.1"],
+                   check=True, capture_output=True)
+    return cert, key
+
+def handshakes(components, count, resume):
+    """
+    Open 'count' connections and return (handshake seconds, resumed count). 
+    A request is made on every connection so the TLS 1.3 session ticket arrives.
+    """
+    elapsed = 0
+    resumed = 0
+    for _ in range(count):
+        if not resume:
+            TLS_SESSIONS.clear()
+        sock = Socket()
+        start = time.perf_counter()
+        sock.connect(components)
+        elapsed += time.perf_counter() - start
+        resumed += sock.socket.session_reused
+
+        sock.send("GET / HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n")
+        sock.receive().read()
+        sock.disconnect()
+    return elapsed, resumed
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = make_certificate(directory)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        get_ssl_context().load_verify_locations(cert)
+
+    server = FixtureServer({"/": Fixture(b"ok")}, context=context).start()
+    components = get_url_components(server.url("/"))
+
+    results = [(resume, *handshakes(components, count, resume)) for resume in [False, True]]
+
+    for resume, elapsed, resumed in results:
+        print("{:>8}: {:6.3f} ms per handshake, {}/{} resumed".format(
+            "resumed" if resume else "full", elapsed / count * 1000, resumed, count))
+    server.shutdown()
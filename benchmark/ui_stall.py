@@ -0,0 +1,73 @@
+"""
+Longest stall of the Tk event loop while Browser loads a large page from a
+local server, with the load on the worker thread (as the Search button does)
+and with the same work done on the Tk thread, as before.
+
+A heartbeat is scheduled every HEARTBEAT ms; the stall is how late it fires.
+Tk needs a display (e.g. run under xvfb-run); with 'headless' the window is the
+stand-in of benchmark.headless_tk and the fonts are the headless ones, so the
+worker thread does not hand font measurements to the Tk thread. Run from the
+repository root:
+    python -m benchmark.ui_stall [paragraphs] [tk|headless]
+"""
+import contextlib, sys, time
+
+from benchmark.headless_tk import headless_tk
+from benchmark.server import Fixture, FixtureServer
+from browser import Browser
+import browser
+
+HEARTBEAT = 5 # ms
+
+class StallMeter:
+    def __init__(self, window) -> None:
+        self.window = window
+        self.max_stall = 0
+        self.last = time.perf_counter()
+        self.window.after(HEARTBEAT, self._beat)
+
+    def _beat(self):
+        now = time.perf_counter()
+        self.max_stall = max(self.max_stall, now - self.last - HEARTBEAT / 1000)
+        self.last = now
+        self.window.after(HEARTBEAT, self._beat)
+
+    def reset(self):
+        self.max_stall = 0
+        self.last = time.perf_counter()
+
+def load_in_background(b, url):
+    b.searchText.set(url)
+    b._load()
+    while b.polling:
+        b.window.update()
+
+def load_on_tk_thread(b, url):
+    b.load_id += 1
+    parser = browser.HTMLParser()
+    b._fetch_and_get(url, b.load_id, parser, browser.WIDTH)
+    b.polling = True
+    while b.polling:
+        b._poll_load()
+        b.window.update()
+
+if __name__ == "__main__":
+    paragraphs = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    page = ("<html><body>" + "<p>Lorem ipsum <b>dolor</b> sit amet, consectetur adipiscing elit.</p>" * paragraphs
+            + "</body></html>").encode()
+    server = FixtureServer({"/big": Fixture(page)}).start()
+
+    headless = len(sys.argv) > 2 and sys.argv[2] == "headless"
+    with headless_tk() if headless else contextlib.nullcontext():
+        b = Browser()
+        b.window.update()
+        meter = StallMeter(b.window)
+        for name, load in [("tk thread", load_on_tk_thread), ("worker thread", load_in_background)]:
+            meter.reset()
+            start = time.perf_counter()
+            load(b, server.url("/big"))
+            elapsed = time.perf_counter() - start
+            print("{:>13}: load {:6.2f} s, max event-loop stall {:7.1f} ms".format(
+                name, elapsed, meter.max_stall * 1000))
+        b.window.destroy()
+    server.shutdown()
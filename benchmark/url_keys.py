@@ -0,0 +1,79 @@
+"""
+Cache hit ratio of a url trace with the cache keyed by the url as typed and by
+its canonical url. The trace visits pages of a local site with a Zipf-like
+popularity, each time spelled one of the ways a user or a page spells a url
+(without a scheme, upper-case scheme or host, with a fragment or dot segments).
+The site is served as "example.test" through a stub resolver.
+
+Also times the url parsing of get_url_components over the trace with and
+without its memo.
+
+Run from the repository root:
+    python -m benchmark.url_keys [requests] [pages]
+"""
+import socket, sys, time
+from random import Random
+
+from benchmark.server import Fixture, FixtureServer
+from transfer.resolver import Resolver
+from url.url import get_url_components, _parse_url
+import transfer.socketutil as socketutil
+import transfer.transferutil as transferutil
+
+SPELLINGS = [
+    (4, "http://example.test:{port}/page/{page}"),
+    (2, "example.test:{port}/page/{page}"),
+    (1, "HTTP://Example.TEST:{port}/page/{page}"),
+    (2, "http://example.test:{port}/page/{page}#comments"),
+    (1, "http://example.test:{port}/section/../page/{page}"),
+]
+
+def url_trace(requests, pages, port, seed=0) -> list:
+    random = Random(seed)
+    weights = [1 / (rank + 1) for rank in range(pages)]
+    visits = random.choices(range(pages), weights, k=requests)
+    spellings = random.choices([spelling for _, spelling in SPELLINGS],
+                               [weight for weight, _ in SPELLINGS], k=requests)
+    return [spelling.format(port=port, page=page) for page, spelling in zip(visits, spellings)]
+
+def replay(trace, lookup) -> float:
+    """
+    Get every url of the trace through lookup (a function of the url) from a new
+    cache and return the hit ratio.
+    """
+    transferutil.CENTRAL_CACHE = transferutil.Cache()
+    for url in trace:
+        lookup(url)
+    return transferutil.CENTRAL_CACHE.hit_ratio()
+
+def time_parsing(trace, parse) -> float:
+    start = time.perf_counter()
+    for url in trace:
+        parse(url)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    body = b"<p>Lorem ipsum <b>dolor</b> sit amet.</p>\n" * 100
+    routes = lambda handler: Fixture(body, headers={"Cache-Control": "max-age=3600"})
+    server = FixtureServer({"/page/{}".format(i): routes for i in range(pages)}).start()
+    port = server.server_address[1]
+    socketutil.RESOLVER = Resolver(getaddrinfo=lambda host, *args: socket.getaddrinfo(
+        "127.0.0.1" if host == "example.test" else host, *args))
+
+    trace = url_trace(requests, pages, port)
+    for name, lookup in [("as typed", lambda url: transferutil.CENTRAL_CACHE.get(url)),
+                         ("canonical", transferutil.get)]:
+        hits_before = sum(server.hits.values())
+        ratio = replay(trace, lookup)
+        print("{:>9} keys: hit ratio {:5.1%}, {} network requests for {} gets".format(
+            name, ratio, sum(server.hits.values()) - hits_before, len(trace)))
+    transferutil.CONNECTION_POOL.close()
+    server.shutdown()
+
+    _parse_url.cache_clear()
+    for name, parse in [("unmemoized", _parse_url.__wrapped__), ("memoized", _parse_url),
+                        ("memoized + trace stage", get_url_components)]:
+        seconds = time_parsing(trace, parse)
+        print("{:>22} parsing: {:6.2f} us per url".format(name, seconds / len(trace) * 1e6))
@@ -1,19 +1,19 @@
 from transfer.transferutil import *
 from response.response import *
 from util import *
-import tkinter, tkinter.font
+from font.font import *
+from data.connection import *
+import tkinter
+import os, sys, threading, queue, time
+from bisect import bisect_left, bisect_right
+from array import array
+from itertools import islice
 
 WIDTH, HEIGHT = 800, 600
 HSTEP, VSTEP = 13, 18
 SCROLL_STEP = 20
-
-FONTS_CACHE = {}
-def get_font(size, weight, slant):
-    key = (size, weight, slant)
-    if key not in FONTS_CACHE:
-        font = tkinter.font.Font(size=size, weight=weight, slant=slant)
-        FONTS_CACHE[key] = font
-    return FONTS_CACHE[key]
+LOAD_POLL_INTERVAL = 20 # ms between checks for a finished background load
+RESIZE_DELAY = 100 # ms without resize events before the page is laid out again
 
 class Browser:
     def __init__(self):
@@ -35,10 +35,14 @@ class Browser:
         self.entry = tkinter.Entry(self.searchFrame, textvariable=self.searchText)
         self.entry.pack(side=tkinter.LEFT, fill=tkinter.X, expand=tkinter.YES)
         
-        self.searchButton = tkinter.Button(self.searchFrame, text="Search",\
-                                           command=lambda : [self._fetch_and_get(), self._print_text_on_canvas()])
+        self.searchButton = tkinter.Button(self.searchFrame, text="Search", command=self._load)
         self.searchButton.pack(side=tkinter.LEFT)
 
+        self.progressText = tkinter.StringVar()
+        self.progressLabel = tkinter.Label(self.searchFrame, textvariable=self.progressText,\
+                                           background="grey", width=16, anchor=tkinter.W)
+        self.progressLabel.pack(side=tkinter.LEFT)
+
         self.canvas = tkinter.Canvas(
             self.window,
             width=WIDTH,
@@ -50,6 +54,19 @@ class Browser:
         self.scroll = 0
         self.tokens = None
 
+        # The canvas items of the display list commands on screen, by command index,
+        # and the scroll they were drawn at. Scrolling moves them instead of redrawing.
+        self.drawn = {}
+        self.drawn_scroll = 0
+        self.resize_job = None
+
+        # Loads run on a worker thread and hand their results back through
+        # this queue. Only the latest load is shown; older ones are cancelled.
+        self.loads = queue.Queue()
+        self.load_id = 0
+        self.load_parser = None
+        self.polling = False
+
     def _scrolldown(self, event):
         if self.tokens == None: return
 
@@ -66,10 +83,33 @@ class Browser:
         self._draw()
 
     def _canvas_resize(self, event):
+        """
+        Tk sends a burst of these while the window is dragged, so the page is only
+        laid out again once the width has not changed for RESIZE_DELAY ms.
+        A change of height alone only needs a redraw.
+        """
         global WIDTH, HEIGHT
 
+        width_changed = event.width != WIDTH
         WIDTH, HEIGHT = event.width, event.height
-        self._print_text_on_canvas()
+        if self.tokens == None: return
+
+        if not width_changed:
+            self._draw()
+            return
+        if self.resize_job is not None:
+            self.window.after_cancel(self.resize_job)
+        self.resize_job = self.window.after(RESIZE_DELAY, self._relayout)
+
+    def _relayout(self):
+        """
+        Lay out the current layout tree again for the new WIDTH and redraw it.
+        """
+        self.resize_job = None
+        self.document.layout()
+        self.canvas_layout = paint_page(self.document)
+        self._clear_canvas()
+        self._draw()
 
     def _mousewheel(self, event):
         if event.num == 4:
@@ -77,30 +117,123 @@ class Browser:
         elif event.num == 5:
             self._scrolldown(event)
     
-    def _fetch_and_get(self):
+    def _load(self):
+        """
+        Start loading the url in the search bar on a worker thread. A load still
+        in flight is cancelled: its result is dropped when it comes back.
+        """
         url = self.searchText.get()
         if url == "":
             return
-        
-        response = get(url)
 
-        if isinstance(response, HTTPResponse):
-            self.tokens = HTMLParser(response.get_raw_body()).parse()
-        else:
-            self.tokens = response.get_raw_body()
+        self.load_id += 1
+        self.load_parser = HTMLParser()
+        worker = threading.Thread(target=self._fetch_and_get,\
+                                  args=(url, self.load_id, self.load_parser, WIDTH), daemon=True)
+        worker.start()
+        if not self.polling:
+            self.polling = True
+            self.window.after(LOAD_POLL_INTERVAL, self._poll_load)
+        self.progressText.set("Loading...")
+
+    def _fetch_and_get(self, url, load_id, parser, width):
+        """
+        Fetch, parse and lay out the page for the width on the worker thread, then
+        queue the result for the Tk thread. The work stops early once a newer load
+        started. The stages of the load are traced (see data.connection).
+        """
+        trace = start_trace(url)
+        try:
+            response = get(url, parser)
+            if load_id != self.load_id: return
+
+            with stage("parse") as args:
+                # The body (of a page or a file) was already streamed into the
+                # parser unless the response came from the cache.
+                if parser.received == 0:
+                    parser.feed(response.get_raw_body())
+                tokens = parser.close()
+                args["nodes"] = count_nodes(tokens)
+            if load_id != self.load_id: return
+
+            # Tkinter forwards the font measurements of the layout to the Tk
+            # thread, which keeps handling events in between.
+            document, canvas_layout = layout_page(tokens, width)
+            self.loads.put((load_id, (tokens, document, canvas_layout, trace), None))
+        except Exception as e:
+            self.loads.put((load_id, None, e))
+        finally:
+            end_trace()
+
+    def _poll_load(self):
+        """
+        Runs on the Tk thread every LOAD_POLL_INTERVAL ms while a load is in flight:
+        shows the progress and draws the page of the latest load once it is done.
+        The page is laid out again if the window was resized during the load.
+        """
+        while not self.loads.empty():
+            load_id, result, error = self.loads.get()
+            if load_id != self.load_id:
+                continue
+            self.polling = False
+            if error is not None:
+                self.progressText.set("Error: " + type(error).__name__)
+                return
+            self.tokens, self.document, self.canvas_layout, trace = result
+            if self.document.page_width != WIDTH:
+                self.document.layout()
+                self.canvas_layout = paint_page(self.document)
+            self.scroll = 0
+            with trace.span("draw") as args:
+                self._clear_canvas()
+                self._draw()
+                args["items"] = len(self.drawn)
+            self._report(trace)
+            return
 
-    def _print_text_on_canvas(self):
-        if self.tokens == None: return
+        self.progressText.set("Loading... {} KB".format(self.load_parser.received // 1024))
+        self.window.after(LOAD_POLL_INTERVAL, self._poll_load)
 
-        self._fill_canvas_layout()
-        self._draw()
+    def _report(self, trace: LoadTrace):
+        """
+        Show how long the load took, print the summary of its trace to stderr and
+        export the trace if TRACE_DIR is set.
+        """
+        self.progressText.set("Loaded in {:.0f} ms".format(trace.elapsed() * 1000))
+        print(trace.summary(), file=sys.stderr)
+        if TRACE_DIR:
+            path = os.path.join(TRACE_DIR, "trace-{}-{}.json".format(int(time.time()), self.load_id))
+            try:
+                os.makedirs(TRACE_DIR, exist_ok=True)
+                trace.export(path)
+            except OSError as e:
+                print("Could not write the trace:", e, file=sys.stderr)
+
+    def _clear_canvas(self):
+        """
+        Forget the canvas items of the previous display list.
+        """
+        self.canvas.delete("all")
+        self.drawn = {}
+        self.drawn_scroll = self.scroll
 
     def _draw(self):
-        self.canvas.delete("all")
-        for cmd in self.canvas_layout:
-            if cmd.top > self.scroll + HEIGHT: continue
-            if cmd.bottom < self.scroll: continue
-            cmd.execute(self.scroll, self.canvas)
+        """
+        Bring the canvas in line with the viewport: the items already on the canvas
+        are moved by the scroll since they were drawn, the ones that left the viewport
+        are deleted and only the commands that entered it are drawn.
+        """
+        visible = self.canvas_layout.visible(self.scroll, self.scroll + HEIGHT)
+
+        for index in [index for index in self.drawn if index not in visible]:
+            self.canvas.delete(self.drawn.pop(index))
+        if self.drawn and self.scroll != self.drawn_scroll:
+            self.canvas.move("all", 0, self.drawn_scroll - self.scroll)
+        self.drawn_scroll = self.scroll
+
+        for index in visible:
+            if index not in self.drawn:
+                self.drawn[index] = self.canvas_layout.execute(index, self.scroll, self.canvas)
 
         # page_coordinates = self.layout_info['page-coordinates']
         # print(page_coordinates)
@@ -110,10 +243,7 @@ class Browser:
         #     self.canvas.create_text(x, y - self.scroll, text=c, font=f, anchor='nw')
 
     def _fill_canvas_layout(self):
-        self.document = DocumentLayout(self.tokens)
-        self.document.layout()
-        self.canvas_layout = []
-        self.document.paint(self.canvas_layout)
+        self.document, self.canvas_layout = layout_page(self.tokens)
         
 
 
@@ -127,13 +257,17 @@ class DocumentLayout:
         self.parent = None
         self.children = [] # layout object children
 
-    def layout(self):
+    def layout(self, width=None):
         """
-        Build a layout tree recursively (from html tree)
+        Build a layout tree recursively (from html tree) for a page 'width' pixels
+        wide, WIDTH by default. Laying out again (e.g. for a new WIDTH) reuses the
+        tree and only recomputes the positions.
         """
-        child = BlockLayout(self.node, self, None)
-        self.children.append(child)
-        self.width = WIDTH - 2 * HSTEP
+        if not self.children:
+            self.children.append(BlockLayout(self.node, self, None))
+        child = self.children[0]
+        self.page_width = WIDTH if width is None else width
+        self.width = self.page_width - 2 * HSTEP
         self.x = HSTEP
         self.y = VSTEP
         child.layout()
@@ -162,15 +296,8 @@ class BlockLayout:
             + "height: " + repr(self.height)
     
     def layout(self):
-        previous = None
-        for html_child in self.node.children:
-            mode = layout_mode(html_child)
-            if mode == "block":
-                child = BlockLayout(html_child, self, previous)
-            else:
-                child = InlineLayout(html_child, self, previous)
-            previous = child
-            self.children.append(child)
+        if not self.children:
+            self._create_children()
         
         self.width = self.parent.width
         self.x = self.parent.x
@@ -186,16 +313,35 @@ class BlockLayout:
 
         #print(self.node, self.children)
 
+    def _create_children(self):
+        previous = None
+        for html_child in self.node.children:
+            mode = layout_mode(html_child)
+            if mode == "block":
+                child = BlockLayout(html_child, self, previous)
+            else:
+                child = InlineLayout(html_child, self, previous)
+            previous = child
+            self.children.append(child)
+
     def paint(self, display_list):
         for child in self.children:
             child.paint(display_list)
 
 class InlineLayout:
+    """
+    Lays out the text under its node in lines.
+
+    The first layout walks the html tree into 'items': the measured words with
+    their fonts, and the line/paragraph breaks between them. Only the line breaking
+    of the items depends on the width, so laying out again just replays them.
+    """
     def __init__(self, node, parent, previous) -> None:
         self.node = node
         self.parent = parent
         self.previous = previous
         self.children = []
+        self.items = None
 
     def __repr__(self):
         return repr(self.node) + ": " \
@@ -212,40 +358,49 @@ class InlineLayout:
         else:
             self.y = self.previous.y + self.previous.height
 
+        if self.items is None:
+            self.weight = "normal"
+            self.style = "roman"
+            self.size = 16
+            self.items = []
+            self._recurse(self.node)
+
         self.cursor_x = 0 # relative to self.x
         self.cursor_y = 0 # relative to self.y
-        self.weight = "normal"
-        self.style = "roman"
-        self.size = 16
         self.display_list = []
         self.buffer_line = []
-        self._recurse(self.node)  
+        for item in self.items:
+            if item[0] == "word":
+                _, word, font, w, space = item
+                if self.cursor_x + w > self.width:
+                    self._flush_buffer_line()
+                self.buffer_line.append((self.cursor_x, word, font))
+                self.cursor_x += w + space
+            elif item[0] == "br":
+                self._flush_buffer_line()
+            elif item[0] == "p":
+                self._flush_buffer_line()
+                self.cursor_y += VSTEP
         self._flush_buffer_line()
         self.height = self.cursor_y
 
     def paint(self, display_list):
         if isinstance(self.node, Element) and self.node == "pre":
             x2, y2 = self.x + self.width, self.y + self.height
-            rect = DrawRect(self.x, self.y, x2, y2, "gray")
-            display_list.append(rect)
+            display_list.add_rect(self.x, self.y, x2, y2, "gray")
 
-        for x, y, word, font in self.display_list:
-            display_list.append(DrawText(x, y, word, font))
+        display_list.add_texts(self.display_list)
 
 
     def _process_text(self, token):
         """
-        Process the text line by line. After recursively applying 
+        Measure the words of the text in the font the enclosing tags set
+        and add them to the items.
         """
         font = get_font(self.size, self.weight, self.style)
         for word in token.text.split():
-            w = font.measure(text=word)
-            if self.cursor_x + w > self.width:
-                self._flush_buffer_line()
-
-            #self.display_list.append((self.cursor_x, self.cursor_y, word, font))
-            self.buffer_line.append((self.cursor_x, word, font))
-            self.cursor_x += w + font.measure(text=" ")
+            w = font.measure(word)
+            self.items.append(("word", word, font, w, font.measure(" ")))
 
     def _recurse(self, tree):
         if isinstance(tree, Text):
@@ -267,10 +422,9 @@ class InlineLayout:
         elif tag == "big":
             self.size += 4
         elif tag == "br":
-            self._flush_buffer_line()
+            self.items.append(("br",))
         elif tag == "p":
-            self._flush_buffer_line()
-            self.cursor_y += VSTEP  
+            self.items.append(("p",))
 
     def _close_tag(self, tag):
         if tag == "i":
@@ -325,37 +479,168 @@ def print_tree(node, indent=0):
     for child in node.children:
         print_tree(child, indent + 2)
 
-class DrawText:
-    def __init__(self, x1, y1, text, font) -> None:
-        self.top = y1
-        self.left = x1
-        self.text = text
-        self.font = font
-        self.bottom = y1 + font.metrics("linespace")
-
-    def execute(self, scroll, canvas):
-        canvas.create_text(
-            self.left, self.top - scroll,
-            text=self.text,
-            font=self.font,
-            anchor='nw',
-        )
+"""
+The kinds of draw commands in a DisplayList.
+"""
+TEXT, RECT = 0, 1
 
-class DrawRect:
-    def __init__(self, x1, y1, x2, y2, color) -> None:
-        self.top = y1
-        self.left = x1
-        self.bottom = y2
-        self.right = x2
-        self.color = color
-    
-    def execute(self, scroll, canvas):
-        canvas.create_rectangle(
-            self.left, self.top - scroll,
-            self.right, self.bottom - scroll,
+class DisplayList:
+    """
+    The draw commands of a page, stored in columns instead of an object per
+    command: command i is kinds[i] (TEXT or RECT) with the box lefts[i], tops[i],
+    rights[i], bottoms[i]. values[i] indexes 'strings' for the word of a text or
+    the color of a rect, and fonts[i] indexes 'font_table' for the font of a text.
+    The columns are arrays of machine numbers, and every distinct string and font
+    is kept once.
+
+    The layout paints into it with add_texts/add_rect, then sort() orders the
+    commands by their top so the ones intersecting a viewport are found with
+    bisect instead of a scan of the whole page.
+    """
+    def __init__(self) -> None:
+        self.kinds = array('B')
+        self.lefts = array('d')
+        self.tops = array('d')
+        self.rights = array('d')
+        self.bottoms = array('d')
+        self.values = array('l')
+        self.fonts = array('l')
+        self.strings = []
+        self.string_index = {}
+        self.font_table = []
+        self.font_index = {}
+        self.linespaces = [] # of the fonts in font_table
+        # Commands starting this far above the viewport can still reach into it.
+        self.max_height = 0
+        self.last_top = float("-inf")
+        self.in_order = True # the commands were added by increasing top
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add_texts(self, words):
+        """
+        Add a text command per (x, y, word, font) of the words. A page has a
+        command per word, so the columns are extended a line of words at a time.
+        """
+        if not words:
+            return
+        xs, ys, texts, word_fonts = zip(*words)
+        for font in set(word_fonts):
+            if font not in self.font_index:
+                self._add_font(font)
+        font_index, linespaces = self.font_index, self.linespaces
+        indexes = [font_index[font] for font in word_fonts]
+
+        string_index = self.string_index
+        # A new word gets the next index: len() is taken before it is added.
+        values = [string_index.setdefault(word, len(string_index)) for word in texts]
+        self._add_new_strings()
+
+        if ys[0] < self.last_top or sorted(ys) != list(ys):
+            self.in_order = False
+        self.last_top = ys[-1]
+        self.kinds.extend([TEXT] * len(xs))
+        self.lefts.extend(xs)
+        self.tops.extend(ys)
+        self.rights.extend(xs)
+        self.bottoms.extend([y + linespaces[index] for y, index in zip(ys, indexes)])
+        self.values.extend(values)
+        self.fonts.extend(indexes)
+
+    def add_rect(self, x1, y1, x2, y2, color):
+        value = self.string_index.setdefault(color, len(self.string_index))
+        self._add_new_strings()
+        if y1 < self.last_top:
+            self.in_order = False
+        self.last_top = y1
+        self.kinds.append(RECT)
+        self.lefts.append(x1)
+        self.tops.append(y1)
+        self.rights.append(x2)
+        self.bottoms.append(y2)
+        self.values.append(value)
+        self.fonts.append(-1)
+        self.max_height = max(self.max_height, y2 - y1)
+
+    def sort(self):
+        """
+        Order the commands by their top, keeping the paint order of equal tops.
+        """
+        if self.in_order:
+            return
+        tops = self.tops
+        order = sorted(range(len(tops)), key=tops.__getitem__)
+        for name in ['kinds', 'lefts', 'tops', 'rights', 'bottoms', 'values', 'fonts']:
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, [column[i] for i in order]))
+        self.in_order = True
+
+    def visible(self, top, bottom) -> set:
+        """
+        Return the indexes of the commands intersecting the [top, bottom] range.
+        """
+        start = bisect_left(self.tops, top - self.max_height)
+        end = bisect_right(self.tops, bottom)
+        bottoms = self.bottoms
+        return {i for i in range(start, end) if bottoms[i] >= top}
+
+    def execute(self, index, scroll, canvas):
+        """
+        Draw the command on the canvas and return the id of its item.
+        """
+        if self.kinds[index] == TEXT:
+            return canvas.create_text(
+                self.lefts[index], self.tops[index] - scroll,
+                text=self.strings[self.values[index]],
+                font=self.font_table[self.fonts[index]].font,
+                anchor='nw',
+            )
+        rect = canvas.create_rectangle(
+            self.lefts[index], self.tops[index] - scroll,
+            self.rights[index], self.bottoms[index] - scroll,
             width=0,
-            fill=self.color,
+            fill=self.strings[self.values[index]],
         )
+        # Backgrounds can be drawn after the text on them has been (when scrolled 
+        # into view), so keep them below everything else.
+        canvas.tag_lower(rect)
+        return rect
+
+    def _add_new_strings(self):
+        """
+        Append the strings added to string_index since the last call to 'strings'.
+        """
+        new = len(self.string_index) - len(self.strings)
+        if new:
+            self.strings.extend(reversed(list(islice(reversed(self.string_index), new))))
+
+    def _add_font(self, font):
+        index = self.font_index[font] = len(self.font_table)
+        self.font_table.append(font)
+        linespace = font.metrics("linespace")
+        self.linespaces.append(linespace)
+        self.max_height = max(self.max_height, linespace)
+        return index
+
+def layout_page(tokens, width=None):
+    """
+    Return the layout tree of the html tree and its display list, laid out for
+    the width (WIDTH by default) with the fonts of the current font backend (see
+    font.font). Needs no display with the headless backend.
+    """
+    with stage("layout"):
+        document = DocumentLayout(tokens)
+        document.layout(width)
+    return document, paint_page(document)
+
+def paint_page(document):
+    with stage("paint") as args:
+        display_list = DisplayList()
+        document.paint(display_list)
+        display_list.sort()
+        args["commands"] = len(display_list)
+        return display_list
 
 if __name__ == "__main__":
     browser = Browser()
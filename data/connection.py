@@ -1,3 +1,9 @@
+from contextlib import contextmanager
+import json, os, threading, time
+
+__all__ = ['ConnectionLog', 'HttpLog', 'FileLog', 'LoadTrace', 'start_trace', 'end_trace',\
+           'current_trace', 'stage', 'count_nodes', 'TRACE_DIR']
+
 class ConnectionLog:
     def __init__(self) -> None:
         self.valid_keys = {}
@@ -9,11 +15,160 @@ class ConnectionLog:
 
 class HttpLog(ConnectionLog):
     def __init__(self) -> None:
-        ConnectionLog.__init__()
+        ConnectionLog.__init__(self)
         self.valid_keys = {"url", "http_request", "http_response"}
 
 class FileLog(ConnectionLog):
     def __init__(self) -> None:
-        ConnectionLog.__init__()
+        ConnectionLog.__init__(self)
         self.valid_keys = {"path", "file_response"}
-        
\ No newline at end of file
+
+"""
+The span arguments the summary of a trace adds up.
+"""
+COUNTS = ['bytes', 'nodes', 'commands']
+
+class LoadTrace(ConnectionLog):
+    """
+    What a page load spent its time on: the spans of its stages (url, dns, connect,
+    tls, send, headers, body, parse, layout, paint, draw), each with its start, duration,
+    thread and arguments such as byte and node counts. The log keeps the facts about
+    the load as a whole.
+
+    A trace is exported in the Chrome trace-event format (see to_chrome_trace), which
+    chrome://tracing and Perfetto open.
+    """
+    def __init__(self, url) -> None:
+        ConnectionLog.__init__(self)
+        self.valid_keys = {"url", "status", "from_cache"}
+        self.add("url", url)
+        self.origin = time.perf_counter()
+        self.spans = [] # (name, start, duration, thread id, args), times in seconds
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **args):
+        """
+        Record the time the with-block takes as a span. The block gets the args
+        dictionary of the span to add the counts it only knows at the end.
+        """
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            duration = time.perf_counter() - start
+            with self.lock:
+                self.spans.append((name, start - self.origin, duration, threading.get_ident(), args))
+
+    def totals(self) -> dict:
+        """
+        Return the seconds spent in every stage. A stage that ran more than once
+        (e.g. connect on a redirect) is summed. The caller holds the lock.
+        """
+        totals = {}
+        for name, _, duration, _, _ in self.spans:
+            totals[name] = totals.get(name, 0) + duration
+        return totals
+
+    def elapsed(self) -> float:
+        """
+        Return the seconds from the start of the load to the end of its last span.
+        """
+        with self.lock:
+            return max([start + duration for _, start, duration, _, _ in self.spans], default=0)
+
+    def summary(self) -> str:
+        """
+        One line of the total and per-stage milliseconds and of the counts.
+        """
+        if not self.spans:
+            return "{}: no stages".format(self.log["url"])
+        counts = {}
+        with self.lock:
+            for _, _, _, _, args in self.spans:
+                for key in COUNTS:
+                    if key in args:
+                        counts[key] = counts.get(key, 0) + args[key]
+            stages = self.totals()
+        line = "{}: {:.1f} ms (".format(self.log["url"], self.elapsed() * 1000)
+        line += ", ".join("{} {:.1f}".format(name, seconds * 1000) for name, seconds in stages.items())
+        line += ")"
+        if counts:
+            line += " " + ", ".join("{} {}".format(value, key) for key, value in counts.items())
+        return line
+
+    def to_chrome_trace(self) -> dict:
+        """
+        Return the trace as a Chrome trace-event document: one complete ("X")
+        event per span, in microseconds from the start of the load.
+        """
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                   "args": {"name": "Awesome Browser"}}]
+        with self.lock:
+            for name, start, duration, tid, args in self.spans:
+                events.append({"name": name, "cat": "load", "ph": "X", "pid": pid, "tid": tid,
+                               "ts": round(start * 1e6, 3), "dur": round(duration * 1e6, 3),
+                               "args": dict(args)})
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": dict(self.log)}
+
+    def export(self, path):
+        """
+        Write the Chrome trace-event JSON of the trace to the path.
+        """
+        with open(path, "w") as f:
+            json.dump(self.to_chrome_trace(), f)
+
+"""
+If set (by the BROWSER_TRACE_DIR environment variable), the Browser writes the
+Chrome trace of every page load in this directory.
+"""
+TRACE_DIR = os.environ.get("BROWSER_TRACE_DIR")
+
+_current = threading.local()
+
+def start_trace(url) -> LoadTrace:
+    """
+    Start the trace of a page load on the current thread: the stages the thread
+    runs from now on are recorded in it.
+    """
+    trace = LoadTrace(url)
+    _current.trace = trace
+    return trace
+
+def end_trace() -> LoadTrace:
+    """
+    Stop recording the stages of the current thread and return its trace.
+    """
+    trace = current_trace()
+    _current.trace = None
+    return trace
+
+def current_trace() -> LoadTrace:
+    return getattr(_current, "trace", None)
+
+@contextmanager
+def stage(name, **args):
+    """
+    Record the with-block as a span of the trace of the current thread, if it has
+    one. Like LoadTrace.span, the block gets the args dictionary of the span (a
+    throwaway one when nothing is traced).
+    """
+    trace = getattr(_current, "trace", None)
+    if trace is None:
+        yield args
+        return
+    with trace.span(name, **args) as span_args:
+        yield span_args
+
+def count_nodes(tree) -> int:
+    """
+    Return the number of nodes in the html (or layout) tree.
+    """
+    count = 0
+    nodes = [tree]
+    while nodes:
+        node = nodes.pop()
+        count += 1
+        nodes.extend(node.children)
+    return count
@@ -0,0 +1,167 @@
+from util import raiseNotDefined
+import threading, unicodedata
+
+__all__ = ['MeasuredFont', 'FontBackend', 'TkFontBackend', 'HeadlessFontBackend', 'FONT_BACKENDS',
+           'FONTS_CACHE', 'get_font', 'set_font_backend', 'measure_hit_ratio']
+
+FONT_MEASURE_LIMIT = 10000 # word widths remembered per font
+
+class FontBackend:
+    """
+    Makes the fonts the layout measures text with. A font has the interface of
+    tkinter.font.Font the layout uses: measure(text) and metrics(name=None).
+    """
+    def font(self, size, weight, slant):
+        raiseNotDefined()
+
+class TkFontBackend(FontBackend):
+    """
+    The fonts Tk draws the page with. Needs a display (a tkinter.Tk root).
+    """
+    def font(self, size, weight, slant):
+        import tkinter.font
+        return tkinter.font.Font(size=size, weight=weight, slant=slant)
+
+"""
+Advance widths of the printable ASCII characters (from the space on) in 1/1000 em,
+the ones of Helvetica/Arial, the usual sans-serif default font.
+"""
+ADVANCE_WIDTHS = dict(zip(map(chr, range(32, 127)), [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]))
+DEFAULT_ADVANCE = 556
+BOLD_FACTOR = 1.07 # bold glyphs are about this much wider
+ASCENT, DESCENT = 0.905, 0.212 # in em, the ones of Arial
+PIXELS_PER_POINT = 96 / 72 # what Tk uses on a 96 dpi screen
+
+class HeadlessFont:
+    """
+    A font that computes its measurements from the tables above instead of asking
+    a window system, so pages can be laid out without a display. The sizes are
+    close to the ones Tk gives for the default sans-serif font: a layout made
+    with it breaks its lines at about the same words.
+    """
+    def __init__(self, size, weight, slant) -> None:
+        self.size = size
+        self.weight = weight
+        self.slant = slant
+        self.pixels = size * PIXELS_PER_POINT
+        self.scale = self.pixels / 1000 * (BOLD_FACTOR if weight == "bold" else 1)
+        ascent, descent = round(self.pixels * ASCENT), round(self.pixels * DESCENT)
+        self.font_metrics = {'ascent': ascent, 'descent': descent,
+                             'linespace': ascent + descent, 'fixed': 0}
+
+    def measure(self, text):
+        width = 0
+        for c in text:
+            advance = ADVANCE_WIDTHS.get(c)
+            if advance is None:
+                advance = self._advance(c)
+            width += advance
+        return round(width * self.scale)
+
+    def metrics(self, name=None):
+        if name is None:
+            return dict(self.font_metrics)
+        return self.font_metrics[name]
+
+    def _advance(self, c):
+        if unicodedata.combining(c):
+            return 0
+        if unicodedata.east_asian_width(c) in ('W', 'F'):
+            return 1000
+        return DEFAULT_ADVANCE
+
+class HeadlessFontBackend(FontBackend):
+    def font(self, size, weight, slant):
+        return HeadlessFont(size, weight, slant)
+
+class MeasuredFont:
+    """
+    A font that remembers its measurements. Every measure and metrics call on
+    a tkinter font is a round trip into Tk, and a page measures the same words
+    (and the space) over and over, in every layout and page load.
+
+    The metrics are asked once. The widths of up to 'limit' words are kept,
+    the first measured one is dropped first when there are more.
+    hits/accesses count the width lookups (see measure_hit_ratio).
+
+    The layout runs on the worker thread of a load and on the Tk thread at once,
+    so new widths are stored under 'lock'; a lookup of a known width takes no lock.
+    """
+    def __init__(self, font, limit=None) -> None:
+        self.font = font
+        self.limit = FONT_MEASURE_LIMIT if limit is None else limit
+        self.widths = {}
+        self.linespace_metrics = None
+        self.hits = 0
+        self.accesses = 0
+        self.lock = threading.Lock()
+
+    def measure(self, text):
+        self.accesses += 1
+        width = self.widths.get(text)
+        if width is not None:
+            self.hits += 1
+            return width
+        width = self.font.measure(text)
+        if self.limit:
+            with self.lock:
+                if len(self.widths) >= self.limit:
+                    del self.widths[next(iter(self.widths))]
+                self.widths[text] = width
+        return width
+
+    def metrics(self, name=None):
+        """
+        Like tkinter.font.Font.metrics: the dictionary of all the metrics,
+        or the one metric by name.
+        """
+        if self.linespace_metrics is None:
+            self.linespace_metrics = self.font.metrics()
+        if name is None:
+            return self.linespace_metrics
+        return self.linespace_metrics[name]
+
+"""
+The font backends by name.
+"""
+FONT_BACKENDS = {'tk': TkFontBackend, 'headless': HeadlessFontBackend}
+FONT_BACKEND: FontBackend = TkFontBackend()
+
+FONTS_CACHE = {}
+FONTS_LOCK = threading.Lock()
+def get_font(size, weight, slant):
+    key = (size, weight, slant)
+    font = FONTS_CACHE.get(key)
+    if font is None:
+        with FONTS_LOCK:
+            if key not in FONTS_CACHE:
+                FONTS_CACHE[key] = MeasuredFont(FONT_BACKEND.font(size, weight, slant))
+            font = FONTS_CACHE[key]
+    return font
+
+def set_font_backend(name):
+    """
+    Make get_font use the backend by name (see FONT_BACKENDS) from now on.
+    The fonts of the previous backend are forgotten.
+    """
+    global FONT_BACKEND
+    with FONTS_LOCK:
+        FONT_BACKEND = FONT_BACKENDS[name]()
+        FONTS_CACHE.clear()
+
+def measure_hit_ratio():
+    """
+    The share of the word widths that were measured from the cache, over all fonts.
+    """
+    with FONTS_LOCK:
+        fonts = list(FONTS_CACHE.values())
+    hits = sum(font.hits for font in fonts)
+    accesses = sum(font.accesses for font in fonts)
+    return hits / accesses if accesses else 0
@@ -33,6 +33,9 @@ class HTTPRequest():
     
     def get_original_url(self) -> str:
         return self._components.get_original_url()
+
+    def get_canonical_url(self) -> str:
+        return self._components.get_canonical_url()
     
     def get_http_request_text(self) -> str:
         return self._msg
@@ -1,6 +1,11 @@
 from io import BufferedReader
-from zlib import decompress
-from typing import Union
+import zlib
+from typing import Iterable, Union
+from itertools import islice
+from codecs import getincrementaldecoder
+import mmap, os, re, sys
+
+from data.connection import stage
 
 __all__ = ['HTTPResponse', 'FileResponse', 'create_http_response', 'create_file_response',\
            'Text', 'Element', 'HTMLParser']
@@ -41,6 +46,23 @@ class HTTPResponse(Response):
         Returns the status line.
         """
         return self.status.get_status_line()
+
+    def is_keep_alive(self) -> bool:
+        """
+        Returns if the connection the response came on can carry another request:
+        the server did not ask to close it and the end of the body was known 
+        without the server closing the connection.
+        """
+        if self.status.get_http_response_version() != "HTTP/1.1":
+            return False
+        if self.contains_header('connection') and \
+            self.get_header_value('connection').lower() == 'close':
+            return False
+        return self.get_status_code() in range(100, 200) or \
+            self.get_status_code() in [204, 304] or \
+            self.contains_header('content-length') or \
+            (self.contains_header('transfer-encoding') and \
+             self.get_header_value('transfer-encoding') == 'chunked')
     
     def contains_header(self, header_name):
         """
@@ -60,57 +82,206 @@ class FileResponse(Response):
     def __init__(self, body: str) -> None:
         Response.__init__(self, body)
 
-def create_http_response(stream: BufferedReader) -> HTTPResponse:
+BODY_CHUNK_SIZE = 64 * 1024
+
+def create_http_response(stream: BufferedReader, parser: "HTMLParser" = None) -> HTTPResponse:
     """
     Create an HTTP response object by reading the buffered stream (possibly from the socket)
 
     The function parses the headers first.
     Then if the transfer-encoding is chuncked, the body is read accordingly.
-    Also, if the body is content-encoded with gzip, it is decompressed accordingly.
+    Also, if the body is content-encoded with gzip or deflate, it is decompressed accordingly.
+    Each piece of the body is decompressed and decoded as soon as it is read, so
+    only the decoded text is ever kept in full.
+
+    The body is read up to its framing (content-length or the last chunk), or up to
+    the end of the stream if there is none, so the stream can carry the next response
+    of a kept-alive connection. The stream is left open for the caller.
+
+    If a parser is given, the decoded body is fed to it as it is read so the html 
+    tree is built while the rest of the body is still on the network. Redirect 
+    bodies are not fed since they are never displayed.
     """
     headers = {}
-    status_line = stream.readline().decode('utf8')
-    while True:
-        line = stream.readline().decode('utf8')
-        if line == "\r\n": break
-        header, value = line.split(":", 1)
-        headers[header.lower()] = value.strip()
-
-    if 'transfer-encoding' in headers and headers['transfer-encoding'] == 'chunked':
-        chunks = []
+    with stage("headers"):
+        status_line = stream.readline().decode('utf8')
+        if status_line == "":
+            raise ConnectionError("Connection closed before the status line")
         while True:
-            length = stream.readline().decode('utf8')
-            length = int(length.replace('\r\n', ''), 16)
-            chunk = stream.read(length)
-            chunks.append(chunk)
-            stream.readline()
-            if length == 0:
-                break
-        body = b''.join(chunks)
-    else:
-        body = stream.read()
+            line = stream.readline().decode('utf8')
+            if line == "\r\n": break
+            header, value = line.split(":", 1)
+            headers[header.lower()] = value.strip()
+
+    status_code = HTTPStatus(status_line).get_status_code()
+    if parser is not None and status_code in range(300, 400) and 'location' in headers:
+        parser = None
 
-    if 'content-encoding' in headers and headers['content-encoding'] == 'gzip':
-        body = decompress(body, wbits=31).decode('utf8')
+    if status_code in range(100, 200) or status_code in [204, 304]:
+        chunks = []
+    elif 'transfer-encoding' in headers and headers['transfer-encoding'] == 'chunked':
+        chunks = _read_chunked_body(stream)
+    elif 'content-length' in headers:
+        chunks = _read_identity_body(stream, int(headers['content-length']))
     else:
-        body = body.decode('utf8')
-    stream.close()
+        chunks = _read_identity_body(stream)
+
+    content_encoding = headers.get('content-encoding', 'identity')
+    if content_encoding in CONTENT_ENCODINGS:
+        chunks = _decompress_body(chunks, content_encoding)
+
+    # The body stage includes the parsing of the body when a parser is fed.
+    with stage("body", encoding=content_encoding, streamed=parser is not None) as args:
+        decoder = getincrementaldecoder('utf8')()
+        texts = []
+        size = 0
+        for chunk in chunks:
+            size += len(chunk)
+            text = decoder.decode(chunk)
+            texts.append(text)
+            if parser is not None: parser.feed(text)
+        text = decoder.decode(b'', final=True)
+        texts.append(text)
+        if parser is not None: parser.feed(text)
+        body = ''.join(texts)
+        args["bytes"] = size
     return HTTPResponse(status_line, headers, body)
 
-def create_file_response(stream: Union[BufferedReader, list[str]]) -> FileResponse:
+def _read_chunked_body(stream: BufferedReader):
+    """
+    Yield the chunks of a chunked transfer-encoded body as they arrive.
+    """
+    while True:
+        length = stream.readline().decode('utf8')
+        length = int(length.replace('\r\n', ''), 16)
+        chunk = stream.read(length)
+        stream.readline()
+        if length == 0:
+            break
+        yield chunk
+
+def _read_identity_body(stream: BufferedReader, length: int = None):
+    """
+    Yield the body in pieces of whatever has arrived (up to BODY_CHUNK_SIZE bytes)
+    until 'length' bytes are read or, without a length, until the end of the stream.
+    """
+    remaining = length
+    while remaining is None or remaining > 0:
+        size = BODY_CHUNK_SIZE if remaining is None else min(remaining, BODY_CHUNK_SIZE)
+        chunk = stream.read1(size)
+        if not chunk:
+            break
+        if remaining is not None:
+            remaining -= len(chunk)
+        yield chunk
+
+"""
+The content-encodings the browser can decode, with the zlib window bits of each.
+"deflate" is zlib-wrapped by the spec but some servers send raw deflate 
+data; see _decompress_body.
+"""
+CONTENT_ENCODINGS = {'gzip': 31, 'deflate': 15}
+
+def _decompress_body(chunks, content_encoding: str):
+    """
+    Yield the decompressed body chunk by chunk. Each step produces at most 
+    BODY_CHUNK_SIZE bytes so a highly compressed body never expands all at once.
+
+    The decompressor is picked once the first two bytes are there (the zlib header
+    of deflate, see _has_zlib_header), however the body is split into chunks.
+    """
+    decompressor = None
+    head = b""
+    for chunk in chunks:
+        if decompressor is None:
+            head += chunk
+            if len(head) < 2:
+                continue
+            chunk, head = head, b""
+            decompressor = _decompressor(content_encoding, chunk)
+        while chunk:
+            yield decompressor.decompress(chunk, BODY_CHUNK_SIZE)
+            chunk = decompressor.unconsumed_tail
+    if decompressor is None and head:
+        decompressor = _decompressor(content_encoding, head)
+        yield decompressor.decompress(head)
+    if decompressor is not None:
+        yield decompressor.flush()
+
+def _decompressor(content_encoding: str, head: bytes):
+    wbits = CONTENT_ENCODINGS[content_encoding]
+    if content_encoding == 'deflate' and not _has_zlib_header(head):
+        wbits = -wbits
+    return zlib.decompressobj(wbits=wbits)
+
+def _has_zlib_header(data: bytes) -> bool:
+    """
+    Return if the data starts with a zlib header (RFC 1950): deflate 
+    compression method and a header checksum that is a multiple of 31.
+    """
+    return len(data) >= 2 and data[0] & 0x0F == 8 and (data[0] << 8 | data[1]) % 31 == 0
+
+"""
+The number of directory entries fed to the parser at a time
+"""
+LISTING_BATCH = 256
+
+def create_file_response(stream: Union[BufferedReader, Iterable[str]], parser: "HTMLParser" = None) -> FileResponse:
     """
     Creates a FileResponse object based on the stream.
-    The stream could be a file content or the result of the call to the directory list.
+    The stream could be a file content or the names in a directory, one line each.
+    The names may come from a generator: they are fed to the parser (if any)
+    LISTING_BATCH at a time as they are listed.
+
+    A file is memory-mapped instead of read, so its bytes are never copied into
+    memory as a whole: the page cache is decoded straight into the body. If a parser
+    is given, the file is decoded BODY_CHUNK_SIZE bytes at a time and every piece is
+    fed to it, so the html tree is built while the rest of the file is paged in.
+    The stream is closed.
     """
-    body = ""
     if isinstance(stream, BufferedReader):
-        body = stream.read()
-        stream.close()
-    elif isinstance(stream, list):
-        body = stream.__str__()[1:-1]
-        body = body.replace(", ", "\r\n")
+        with stream, stage("body", streamed=parser is not None) as args:
+            size = os.fstat(stream.fileno()).st_size
+            args["bytes"] = size
+            if size == 0: # an empty file cannot be mapped
+                body = ""
+                if parser is not None: parser.feed(body)
+            else:
+                with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    body = _decode_mapped(mapped, size, parser)
+    else:
+        names = iter(stream)
+        texts = []
+        while True:
+            batch = list(islice(names, LISTING_BATCH))
+            if not batch and texts:
+                break
+            text = ("\r\n" if texts else "") + "\r\n".join(repr(name) for name in batch)
+            texts.append(text)
+            if parser is not None: parser.feed(text)
+            if not batch:
+                break
+        body = "".join(texts)
     return FileResponse(body)
 
+def _decode_mapped(mapped: mmap.mmap, size: int, parser: "HTMLParser" = None) -> str:
+    """
+    Return the text of the mapped file, feeding it to the parser (if any) piece by piece.
+    """
+    if parser is None:
+        return str(mapped, 'utf8', errors='replace')
+    decoder = getincrementaldecoder('utf8')(errors='replace')
+    texts = []
+    with memoryview(mapped) as view:
+        for start in range(0, size, BODY_CHUNK_SIZE):
+            text = decoder.decode(view[start:start + BODY_CHUNK_SIZE])
+            texts.append(text)
+            parser.feed(text)
+    text = decoder.decode(b'', final=True)
+    texts.append(text)
+    parser.feed(text)
+    return ''.join(texts)
+
 # HELPER CLASSES
 
 class Body:
@@ -172,15 +343,26 @@ class HTTPResponseHeader:
 #           Helper Classes to parse HTML    #
 #############################################
 
+"""
+The children of every Text node. A text has none, so all of them share this
+immutable empty tuple instead of allocating an empty list each.
+"""
+NO_CHILDREN = ()
+
 class Text:
     """
     A text string in html. It has a parent who is a tag in html.
     The children attribute is added to avoid isinstance calls in the 
     clients.
+
+    Pages have hundreds of thousands of nodes, so the node classes use 
+    __slots__ instead of a __dict__ per instance.
     """
+    __slots__ = ('text', 'parent')
+    children = NO_CHILDREN # to avoid isinstance with Element
+
     def __init__(self, text, parent) -> None:
         self.text = text
-        self.children = [] # to avoid isinstance with Element
         self.parent = parent
 
     def __repr__(self):
@@ -190,13 +372,25 @@ class Element:
     """
     A tag in the html. It has children of Element or Text.
     It could also have a parent of Element.
+
+    Most elements have no attributes, so their attribute dictionary is only
+    created when it is first asked for. The parser interns the tag names so
+    all the elements of a tag share one string.
     """
+    __slots__ = ('tag', '_attributes', 'children', 'parent')
+
     def __init__(self, tag, attributes, parent) -> None:
         self.tag = tag
-        self.attributes = attributes
+        self._attributes = attributes or None
         self.children = []
         self.parent = parent
 
+    @property
+    def attributes(self) -> dict:
+        if self._attributes is None:
+            self._attributes = {}
+        return self._attributes
+
     def __repr__(self):
         return "<" + repr(self.tag) + ">"
 
@@ -211,30 +405,63 @@ HEAD_TAGS = [
 ]
 
 
+TAG_DELIMITERS = re.compile(r"([<>])")
+
 class HTMLParser:
     """
-    
+    Builds the html tree out of the body string.
+
+    The body is split on the tag delimiters ('<' and '>') with a compiled
+    regex so the text/tag tokens are slices of the body instead of being
+    built one character at a time.
+
+    The parser can be driven as a whole string with parse() or pushed the
+    document piece by piece with feed(chunk) followed by close(), e.g. while
+    the body is still being read from the socket.
     """
-    def __init__(self, body):
+    def __init__(self, body=""):
         self.body = body
         self.unfinished = []
 
+        self.received = 0 # number of characters fed so far
+        self._pending = "" # token whose closing delimiter has not arrived yet
+        self._in_tag = False
+
     def parse(self):
-        text = ""
-        in_tag = False
-        for c in self.body:
-            if c == "<":
-                in_tag = True
-                if text: self._add_text(text)
-                text = ""
-            elif c == ">":
-                in_tag = False
-                self._add_tag(text)
-                text = ""
+        """
+        Parse the whole body given to the constructor and return the root.
+        """
+        self.feed(self.body)
+        return self.close()
+
+    def feed(self, chunk: str):
+        """
+        Push the next piece of the document into the parser. The tree is
+        built as far as the chunk allows; a token cut by the end of the chunk
+        is kept until its closing delimiter arrives in a later chunk.
+        """
+        self.received += len(chunk)
+        # Splitting on a capturing group alternates between the token
+        # slices and the delimiter that ends each of them.
+        parts = TAG_DELIMITERS.split(chunk)
+        parts[0] = self._pending + parts[0]
+        for i in range(0, len(parts) - 1, 2):
+            token = parts[i]
+            if parts[i + 1] == "<":
+                self._in_tag = True
+                if token: self._add_text(token)
             else:
-                text += c
-        if not in_tag and text:
-            self._add_text(text)
+                self._in_tag = False
+                self._add_tag(token)
+        self._pending = parts[-1]
+
+    def close(self):
+        """
+        Signal the end of the document and return the root of the tree.
+        """
+        if not self._in_tag and self._pending:
+            self._add_text(self._pending)
+        self._pending = ""
         return self._finish()
 
     def _add_text(self, text):
@@ -273,9 +500,11 @@ class HTMLParser:
     
     def _get_attributes(self, text):
         parts = text.split()
-        tag = parts[0].lower()
-        attributes = {}
+        tag = sys.intern(parts[0].lower())
+        attributes = None # most tags have none, see Element
         for pair in parts[1:]:
+            if attributes is None:
+                attributes = {}
             if "=" in pair:
                 key, value = pair.split("=", 1)
                 if len(value) > 2 and value[0] in ["'", "\""]:
@@ -286,6 +515,9 @@ class HTMLParser:
         return tag, attributes
 
     def _add_implicit_tags(self, tag):
+        # Implicit tags are only added right under the root, so there is
+        # nothing to do once the document is deeper than html/head.
+        if len(self.unfinished) > 2: return
         while True:
             open_tags = [node.tag for node in self.unfinished]
             if open_tags == [] and tag != "html":
@@ -0,0 +1,45 @@
+import os, tempfile, unittest
+
+from benchmark.headless_tk import headless_tk
+from browser import Browser, HTMLParser
+import browser
+
+class BackgroundLoadTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "page.html")
+        with open(self.path, "w") as f:
+            f.write("<html><body><p>" + "Some words to break into lines. " * 50 + "</p></body></html>")
+
+        width = browser.WIDTH
+        self.addCleanup(setattr, browser, "WIDTH", width)
+        context = headless_tk()
+        context.__enter__()
+        self.addCleanup(context.__exit__, None, None, None)
+        self.browser = Browser()
+
+    def load(self, width, width_when_shown):
+        """
+        Lay the page out for the width on this thread as the worker would, and show
+        it after the window was resized to width_when_shown.
+        """
+        b = self.browser
+        b.load_id += 1
+        b.load_parser = HTMLParser()
+        b._fetch_and_get("file://" + self.path, b.load_id, b.load_parser, width)
+        browser.WIDTH = width_when_shown
+        b.polling = True
+        b._poll_load()
+        self.assertFalse(b.polling)
+
+    def test_page_is_laid_out_for_the_width_of_the_load(self):
+        browser.WIDTH = 800
+        self.load(400, 400)
+        self.assertEqual(self.browser.document.page_width, 400)
+        self.assertLess(max(self.browser.canvas_layout.lefts), 400)
+
+    def test_resize_during_the_load_lays_the_page_out_again(self):
+        self.load(400, 600)
+        self.assertEqual(self.browser.document.page_width, 600)
+        self.assertGreater(max(self.browser.canvas_layout.lefts), 400)
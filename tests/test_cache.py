@@ -0,0 +1,77 @@
+import time, unittest
+
+from response.response import HTTPResponse
+from transfer.transferutil import Cache, _value_size
+
+def cache_value(body="x"):
+    response = HTTPResponse("HTTP/1.1 200 OK\r\n", {'cache-control': 'max-age=60'}, body)
+    return {'request': None, 'response': response, 'expires-at': time.time() + 60}
+
+class EvictionTest(unittest.TestCase):
+    def test_lru_evicts_the_least_recently_used(self):
+        cache = Cache(capacity=3, policy="lru")
+        for key in "abc":
+            cache.put(key, cache_value())
+        cache.lookup("a")
+        cache.put("d", cache_value())
+        self.assertEqual(sorted(cache.map), ["a", "c", "d"])
+
+    def test_lfu_evicts_the_least_frequently_used(self):
+        cache = Cache(capacity=3, policy="lfu")
+        for key in "abc":
+            cache.put(key, cache_value())
+        cache.lookup("a")
+        cache.lookup("a")
+        cache.lookup("b")
+        cache.put("d", cache_value())
+        self.assertEqual(sorted(cache.map), ["a", "b", "d"])
+
+    def test_gdsf_evicts_large_rarely_used_values_first(self):
+        cache = Cache(capacity=3, policy="gdsf")
+        cache.put("small", cache_value("x" * 10))
+        cache.put("large", cache_value("x" * 10000))
+        cache.put("other", cache_value("x" * 10))
+        cache.put("new", cache_value("x" * 10))
+        self.assertEqual(sorted(cache.map), ["new", "other", "small"])
+
+    def test_byte_budget(self):
+        value = cache_value("x" * 100)
+        cache = Cache(max_bytes=3 * _value_size(value))
+        for key in "abcd":
+            cache.put(key, cache_value("x" * 100))
+        self.assertEqual(sorted(cache.map), ["b", "c", "d"])
+        self.assertEqual(cache.size, 3 * _value_size(value))
+
+    def test_value_larger_than_the_budget_is_not_kept(self):
+        cache = Cache(max_bytes=5 * _value_size(cache_value("x" * 100)))
+        for key in "abcde":
+            cache.put(key, cache_value("x" * 100))
+        size = cache.size
+        cache.put("huge", cache_value("x" * 5000))
+        self.assertEqual(sorted(cache.map), list("abcde"))
+        self.assertEqual((cache.size, cache.count), (size, 5))
+
+    def test_value_larger_than_the_budget_drops_the_old_one(self):
+        cache = Cache(max_bytes=5 * _value_size(cache_value("x" * 100)))
+        cache.put("a", cache_value("x" * 100))
+        cache.put("a", cache_value("x" * 5000))
+        self.assertIsNone(cache.lookup("a"))
+        self.assertEqual((cache.size, cache.count), (0, 0))
+
+    def test_gdsf_heap_does_not_grow_with_lookups(self):
+        cache = Cache(capacity=10, policy="gdsf")
+        cache.put("a", cache_value())
+        for _ in range(10000):
+            cache.lookup("a")
+        self.assertLessEqual(len(cache.policy.heap), 3)
+
+    def test_gdsf_heap_drops_removed_nodes(self):
+        cache = Cache(capacity=10, policy="gdsf")
+        for i in range(1000):
+            cache.put(i, cache_value())
+        self.assertEqual(len(cache.map), 10)
+        self.assertLessEqual(len(cache.policy.heap), 21)
+        self.assertLessEqual(set(cache.map), {entry[2].key for entry in cache.policy.heap})
+
+if __name__ == "__main__":
+    unittest.main()
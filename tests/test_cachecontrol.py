@@ -0,0 +1,54 @@
+import unittest
+
+from transfer.cachecontrol import parse_cache_control, freshness_lifetime
+from request.request import FileRequest
+from response.response import FileResponse
+from url.url import get_url_components
+import transfer.transferutil as transferutil
+
+class ParseCacheControlTest(unittest.TestCase):
+    def test_directives(self):
+        self.assertEqual(parse_cache_control('max-age=60, no-cache="set-cookie", must-revalidate'),
+                         {'max-age': 60, 'no-cache': 'set-cookie', 'must-revalidate': True})
+
+    def test_names_are_lower_cased_and_empty_parts_skipped(self):
+        self.assertEqual(parse_cache_control(" , ,Max-Age = 10 ,Private"), {'max-age': 10, 'private': True})
+        self.assertEqual(parse_cache_control(""), {})
+
+    def test_quoted_argument_with_commas(self):
+        self.assertEqual(parse_cache_control('no-cache="set-cookie, x-foo", max-age=5'),
+                         {'no-cache': 'set-cookie, x-foo', 'max-age': 5})
+        self.assertEqual(parse_cache_control(r'private="a\"b, c"'), {'private': 'a"b, c'})
+
+    def test_quoted_number(self):
+        self.assertEqual(parse_cache_control('max-age="20"'), {'max-age': 20})
+
+class FreshnessLifetimeTest(unittest.TestCase):
+    DATE = "Sun, 18 Oct 2026 10:00:00 GMT"
+
+    def test_max_age_wins_over_expires(self):
+        headers = {'date': self.DATE, 'expires': "Sun, 18 Oct 2026 11:00:00 GMT"}
+        self.assertEqual(freshness_lifetime(headers, {'max-age': 30}), 30)
+
+    def test_expires_relative_to_date(self):
+        headers = {'date': self.DATE, 'expires': "Sun, 18 Oct 2026 11:00:00 GMT"}
+        self.assertEqual(freshness_lifetime(headers, {}), 3600)
+        headers['expires'] = "Sun, 18 Oct 2026 09:00:00 GMT"
+        self.assertEqual(freshness_lifetime(headers, {}), 0)
+
+    def test_invalid_expires_is_expired(self):
+        self.assertEqual(freshness_lifetime({'expires': "0"}, {}), 0)
+
+    def test_no_lifetime(self):
+        self.assertIsNone(freshness_lifetime({}, {}))
+        self.assertIsNone(freshness_lifetime({}, {'s-maxage': 60}))
+
+class CacheIfAppropriateTest(unittest.TestCase):
+    def test_file_responses_are_not_cached(self):
+        components = get_url_components("file:///tmp/page.html")
+        value = {'request': FileRequest(components), 'response': FileResponse("<p>hi</p>")}
+        transferutil._cache_if_appropriate(value)
+        self.assertNotIn(components.get_canonical_url(), transferutil.CENTRAL_CACHE.map)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os, tempfile, time, unittest
+
+from transfer.diskcache import DiskCache
+import transfer.diskcache as diskcache
+
+def record(body, expires_at=None):
+    return {'status-line': "HTTP/1.1 200 OK\r\n", 'headers': {'etag': '"1"'},
+            'expires-at': expires_at, 'body': body}
+
+class DiskCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        cache = DiskCache(self.directory)
+        cache.put("http://a/", record("<p>é</p>", 123))
+        found = cache.get("http://a/")
+        self.assertEqual((found['body'], found['expires-at'], found['headers']), ("<p>é</p>", 123, {'etag': '"1"'}))
+        self.assertIsNone(cache.get("http://b/"))
+
+    def test_survives_a_restart_from_the_journal_and_from_the_index(self):
+        cache = DiskCache(self.directory)
+        cache.put("http://a/", record("a"))
+        cache.put("http://b/", record("b"))
+        cache.update("http://a/", {'expires-at': 5})
+        self.assertEqual(DiskCache(self.directory).get("http://a/")['expires-at'], 5)
+
+        cache.flush()
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'journal')))
+        reopened = DiskCache(self.directory)
+        self.assertEqual(reopened.get("http://a/")['expires-at'], 5)
+        self.assertEqual(reopened.get("http://b/")['body'], "b")
+
+    def test_journal_is_folded_into_the_index(self):
+        limit = diskcache.JOURNAL_LIMIT
+        diskcache.JOURNAL_LIMIT = 5
+        try:
+            cache = DiskCache(self.directory)
+            for i in range(12):
+                cache.put("http://a/{}".format(i), record(str(i)))
+            self.assertLess(cache.journal_lines, 5)
+            reopened = DiskCache(self.directory)
+            self.assertEqual([reopened.get("http://a/{}".format(i))['body'] for i in range(12)],
+                             [str(i) for i in range(12)])
+        finally:
+            diskcache.JOURNAL_LIMIT = limit
+
+    def test_torn_journal_line_is_ignored(self):
+        DiskCache(self.directory).put("http://a/", record("a"))
+        with open(os.path.join(self.directory, 'journal'), 'a') as f:
+            f.write('{"key": "http://b/", "entr')
+        self.assertEqual(DiskCache(self.directory).get("http://a/")['body'], "a")
+
+    def test_equal_bodies_share_a_file(self):
+        cache = DiskCache(self.directory)
+        cache.put("http://a/", record("same"))
+        cache.put("http://b/", record("same"))
+        self.assertEqual(len(os.listdir(os.path.join(self.directory, 'bodies'))), 1)
+        cache.put("http://a/", record("other"))
+        self.assertEqual(cache.get("http://b/")['body'], "same")
+
+    def test_least_recently_used_are_evicted(self):
+        cache = DiskCache(self.directory)
+        cache.put("http://a/", record(os.urandom(1000).hex()))
+        size = cache.total
+        cache.max_bytes = 2 * size + size // 2
+        cache.put("http://b/", record(os.urandom(1000).hex()))
+        time.sleep(0.01)
+        cache.get("http://a/")
+        cache.put("http://c/", record(os.urandom(1000).hex()))
+        self.assertIsNone(cache.get("http://b/"))
+        self.assertIsNotNone(cache.get("http://a/"))
+        self.assertEqual(len(os.listdir(os.path.join(self.directory, 'bodies'))), 2)
+        self.assertLessEqual(cache.total, cache.max_bytes)
+
+    def test_young_unreferenced_bodies_are_kept(self):
+        bodies = os.path.join(self.directory, 'bodies')
+        os.makedirs(bodies)
+        for name in ["young", "old"]:
+            open(os.path.join(bodies, name), 'w').close()
+        old = time.time() - diskcache.ORPHAN_AGE - 10
+        os.utime(os.path.join(bodies, "old"), (old, old))
+        DiskCache(self.directory).get("http://a/")
+        self.assertEqual(os.listdir(bodies), ["young"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os, tempfile, unittest
+
+from response.response import HTMLParser, create_file_response
+from url.url import get_url_components
+import transfer.transferutil as transferutil
+
+class RecordingParser(HTMLParser):
+    def __init__(self) -> None:
+        HTMLParser.__init__(self)
+        self.chunks = []
+
+    def feed(self, chunk):
+        self.chunks.append(chunk)
+        HTMLParser.feed(self, chunk)
+
+class FileLoadTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, data: bytes):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_file_is_decoded_and_fed(self):
+        text = "<p>héllo</p>" * 20000
+        parser = RecordingParser()
+        response = create_file_response(open(self.write("a.html", text.encode()), 'rb'), parser)
+        self.assertEqual(response.get_raw_body(), text)
+        self.assertGreater(len(parser.chunks), 1)
+        self.assertEqual("".join(parser.chunks), text)
+
+    def test_empty_and_invalid_files(self):
+        self.assertEqual(create_file_response(open(self.write("empty", b""), 'rb')).get_raw_body(), "")
+        self.assertEqual(create_file_response(open(self.write("bad", b"a\xffb"), 'rb')).get_raw_body(), "a�b")
+
+    def test_directory_listing_is_streamed_and_cached_until_it_changes(self):
+        for i in range(600):
+            self.write("f{:03}".format(i), b"")
+        components = get_url_components("file://" + self.directory)
+        parser = RecordingParser()
+        body = transferutil._file_get(components, parser)['response'].get_raw_body()
+        self.assertEqual(sorted(body.split("\r\n")), [repr("f{:03}".format(i)) for i in range(600)])
+        self.assertGreater(len(parser.chunks), 1)
+        self.assertEqual("".join(parser.chunks), body)
+        self.assertIn(self.directory, transferutil.DIRECTORY_LISTINGS)
+
+        self.assertEqual(transferutil._file_get(components)['response'].get_raw_body(), body)
+        self.write("new", b"")
+        os.utime(self.directory, ns=(0, os.stat(self.directory).st_mtime_ns + 1))
+        self.assertIn(repr("new"), transferutil._file_get(components)['response'].get_raw_body())
+
+if __name__ == "__main__":
+    unittest.main()
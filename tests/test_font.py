@@ -0,0 +1,47 @@
+import sys, threading, unittest
+
+from font.font import HeadlessFont, MeasuredFont, get_font, set_font_backend
+
+class MeasuredFontTest(unittest.TestCase):
+    def test_remembers_widths_up_to_the_limit(self):
+        font = MeasuredFont(HeadlessFont(16, "normal", "roman"), limit=2)
+        for word in ["a", "b", "a", "c"]:
+            font.measure(word)
+        self.assertEqual(list(font.widths), ["b", "c"])
+        self.assertEqual((font.hits, font.accesses), (1, 4))
+
+    def test_threads_evicting_at_the_limit(self):
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, switch_interval)
+
+        font = MeasuredFont(HeadlessFont(16, "normal", "roman"), limit=8)
+        errors = []
+        def measure(offset):
+            try:
+                for i in range(20000):
+                    font.measure(str(offset + i))
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=measure, args=(n * 100000,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(font.widths), 8)
+
+class GetFontTest(unittest.TestCase):
+    def setUp(self):
+        set_font_backend("headless")
+        self.addCleanup(set_font_backend, "tk")
+
+    def test_threads_share_one_font_per_style(self):
+        fonts = []
+        threads = [threading.Thread(target=lambda: fonts.append(get_font(16, "bold", "roman")))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(font) for font in fonts}), 1)
@@ -0,0 +1,64 @@
+import time, unittest
+
+from benchmark.server import Fixture, FixtureServer
+from transfer.socketutil import CONNECTION_POOL
+from transfer.transferutil import Cache, canonical_url
+import transfer.transferutil as transferutil
+
+class PutRedirectTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = Cache()
+        self.expires_at = time.time() + 60
+
+    def test_follows_remembered_redirects(self):
+        self.cache.put_redirect("http://a/", "http://b/", self.expires_at)
+        self.cache.put_redirect("http://b/", "http://c/", self.expires_at)
+        self.assertEqual(self.cache.resolve_redirect("http://a/"), "http://c/")
+        self.assertEqual(self.cache.redirect_hops, 2)
+
+    def test_does_not_remember_a_redirect_to_itself(self):
+        self.cache.put_redirect("http://a/", "http://a/", self.expires_at)
+        self.assertEqual(self.cache.redirects, {})
+
+    def test_does_not_remember_the_redirect_closing_a_loop(self):
+        self.cache.put_redirect("http://a/", "http://b/", self.expires_at)
+        self.cache.put_redirect("http://b/", "http://c/", self.expires_at)
+        self.cache.put_redirect("http://c/", "http://a/", self.expires_at)
+        self.assertNotIn("http://c/", self.cache.redirects)
+        self.assertEqual(self.cache.resolve_redirect("http://a/"), "http://c/")
+
+    def test_forgets_expired_redirects(self):
+        self.cache.put_redirect("http://a/", "http://b/", time.time() - 1)
+        self.assertEqual(self.cache.resolve_redirect("http://a/"), "http://a/")
+        self.assertEqual(self.cache.redirects, {})
+
+def redirect(location, status=302, headers=None):
+    return Fixture(status=status, headers=dict(headers or {}, Location=location))
+
+class RedirectLoopTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FixtureServer({
+            "/a": redirect("/b"),
+            "/b": redirect("/a"),
+            "/old": redirect("/new", status=301),
+            "/new": Fixture(b"<p>new</p>", headers={"Cache-Control": "max-age=60"}),
+        }).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.addCleanup(CONNECTION_POOL.close)
+
+        central = transferutil.CENTRAL_CACHE
+        self.addCleanup(setattr, transferutil, "CENTRAL_CACHE", central)
+        transferutil.CENTRAL_CACHE = Cache()
+
+    def test_a_loop_ends_at_the_redirect_closing_it(self):
+        response = transferutil.get(canonical_url(self.server.url("/a")))
+        self.assertTrue(response.is_redirect())
+        self.assertEqual(response.get_header_value("location"), "/a")
+        self.assertEqual((self.server.hits["/a"], self.server.hits["/b"]), (1, 1))
+
+    def test_permanent_redirects_are_skipped_the_next_time(self):
+        url = canonical_url(self.server.url("/old"))
+        self.assertEqual(transferutil.get(url).get_raw_body(), "<p>new</p>")
+        self.assertEqual(transferutil.get(url).get_raw_body(), "<p>new</p>")
+        self.assertEqual((self.server.hits["/old"], self.server.hits["/new"]), (1, 1))
@@ -0,0 +1,123 @@
+import errno, socket, unittest
+from unittest import mock
+
+from transfer.resolver import Resolver, connect_first, interleave_families
+
+V4, V6 = socket.AF_INET, socket.AF_INET6
+
+def address(family, host):
+    return (family, socket.SOCK_STREAM, 6, "", (host, 80))
+
+class StubGetaddrinfo:
+    def __init__(self, addresses) -> None:
+        self.addresses = addresses
+        self.calls = 0
+
+    def __call__(self, host, port, family, type):
+        self.calls += 1
+        if host not in self.addresses:
+            raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+        return list(self.addresses[host])
+
+class InterleaveFamiliesTest(unittest.TestCase):
+    def test_alternates_starting_with_the_first_family(self):
+        addresses = [address(V6, "::1"), address(V6, "::2"), address(V6, "::3"),
+                     address(V4, "10.0.0.1"), address(V4, "10.0.0.2")]
+        ordered = interleave_families(addresses)
+        self.assertEqual([a[4][0] for a in ordered], ["::1", "10.0.0.1", "::2", "10.0.0.2", "::3"])
+
+    def test_keeps_the_order_within_a_family(self):
+        addresses = [address(V4, "10.0.0.1"), address(V6, "::1"), address(V4, "10.0.0.2")]
+        ordered = interleave_families(addresses)
+        self.assertEqual([a[4][0] for a in ordered], ["10.0.0.1", "::1", "10.0.0.2"])
+
+    def test_one_family_and_no_addresses(self):
+        addresses = [address(V4, "10.0.0.1"), address(V4, "10.0.0.2")]
+        self.assertEqual(interleave_families(addresses), addresses)
+        self.assertEqual(interleave_families([]), [])
+
+class ResolverTest(unittest.TestCase):
+    def setUp(self):
+        self.stub = StubGetaddrinfo({
+            "a.test": [address(V6, "::1"), address(V6, "::2"), address(V4, "10.0.0.1")],
+            "b.test": [address(V4, "10.0.0.2")],
+            "c.test": [address(V4, "10.0.0.3")],
+        })
+
+    def test_returns_the_interleaved_addresses(self):
+        resolver = Resolver(getaddrinfo=self.stub)
+        addresses = resolver.resolve("a.test", 80)
+        self.assertEqual([a[4][0] for a in addresses], ["::1", "10.0.0.1", "::2"])
+
+    def test_remembers_lookups_for_the_ttl(self):
+        resolver = Resolver(ttl=60, getaddrinfo=self.stub)
+        with mock.patch("transfer.resolver.time.monotonic", return_value=1000):
+            resolver.resolve("a.test", 80)
+            resolver.resolve("a.test", 80)
+        self.assertEqual(self.stub.calls, 1)
+        self.assertEqual((resolver.hits, resolver.lookups), (1, 2))
+
+        with mock.patch("transfer.resolver.time.monotonic", return_value=1061):
+            resolver.resolve("a.test", 80)
+        self.assertEqual(self.stub.calls, 2)
+
+    def test_ports_are_looked_up_separately(self):
+        resolver = Resolver(getaddrinfo=self.stub)
+        resolver.resolve("a.test", 80)
+        resolver.resolve("a.test", 443)
+        self.assertEqual(self.stub.calls, 2)
+
+    def test_drops_the_oldest_lookup_over_max_entries(self):
+        resolver = Resolver(max_entries=2, getaddrinfo=self.stub)
+        for host in ["a.test", "b.test", "c.test"]:
+            resolver.resolve(host, 80)
+        self.assertEqual([key[0] for key in resolver.entries], ["b.test", "c.test"])
+
+    def test_does_not_remember_failures(self):
+        resolver = Resolver(getaddrinfo=self.stub)
+        for _ in range(2):
+            with self.assertRaises(socket.gaierror):
+                resolver.resolve("missing.test", 80)
+        self.assertEqual(self.stub.calls, 2)
+        self.assertEqual(resolver.entries, {})
+
+    def test_clear(self):
+        resolver = Resolver(getaddrinfo=self.stub)
+        resolver.resolve("a.test", 80)
+        resolver.clear()
+        resolver.resolve("a.test", 80)
+        self.assertEqual(self.stub.calls, 2)
+
+def closed_port():
+    """
+    A local port nothing listens on.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class ConnectFirstTest(unittest.TestCase):
+    def setUp(self):
+        self.listener = socket.socket()
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen()
+        self.addCleanup(self.listener.close)
+
+    def local(self, port):
+        return (V4, socket.SOCK_STREAM, 6, "", ("127.0.0.1", port))
+
+    def test_skips_a_refused_address(self):
+        addresses = [self.local(closed_port()), self.local(self.listener.getsockname()[1])]
+        with connect_first(addresses, delay=5, timeout=5) as sock:
+            self.assertEqual(sock.getpeername(), self.listener.getsockname())
+            self.assertTrue(sock.getblocking())
+
+    def test_raises_the_error_of_a_single_attempt(self):
+        with self.assertRaises(OSError) as raised:
+            connect_first([self.local(closed_port())], timeout=5)
+        self.assertEqual(raised.exception.errno, errno.ECONNREFUSED)
+
+    def test_lists_the_errors_of_all_attempts(self):
+        addresses = [self.local(closed_port()), self.local(closed_port())]
+        with self.assertRaisesRegex(OSError, "All connection attempts failed"):
+            connect_first(addresses, timeout=5)
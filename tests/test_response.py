@@ -0,0 +1,36 @@
+import gzip, io, unittest, zlib
+
+from response.response import create_http_response
+
+def response_bytes(body: bytes, encoding: str) -> bytes:
+    return b"HTTP/1.1 200 OK\r\nContent-Encoding: " + encoding.encode() + \
+        b"\r\nContent-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+
+class OneByteReader(io.BufferedReader):
+    """
+    A stream that hands out the body one byte per read1, like a slow network.
+    """
+    def read1(self, size=-1):
+        return io.BufferedReader.read1(self, 1)
+
+class ContentEncodingTest(unittest.TestCase):
+    TEXT = "<p>Lorem ipsum dolor sit amet</p>" * 200
+
+    def compressed(self):
+        raw = zlib.compressobj(wbits=-15)
+        return {
+            'gzip': gzip.compress(self.TEXT.encode()),
+            'deflate': zlib.compress(self.TEXT.encode()),
+            'raw deflate': raw.compress(self.TEXT.encode()) + raw.flush(),
+        }
+
+    def test_bodies_decode_however_they_are_split(self):
+        for name, body in self.compressed().items():
+            encoding = name.split()[-1]
+            for reader in [io.BufferedReader, OneByteReader]:
+                stream = reader(io.BytesIO(response_bytes(body, encoding)))
+                response = create_http_response(stream)
+                self.assertEqual(response.get_raw_body(), self.TEXT, (name, reader.__name__))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+from benchmark.server import Fixture, FixtureServer
+from transfer.socketutil import CONNECTION_POOL
+from transfer.transferutil import Cache, canonical_url
+import transfer.transferutil as transferutil
+
+class VersionedPage:
+    """
+    A page with an ETag that expires at once; a revalidation gets a 304 with
+    the version header of the count of requests so far.
+    """
+    def __init__(self) -> None:
+        self.requests = 0
+
+    def __call__(self, handler):
+        self.requests += 1
+        headers = {"ETag": '"v1"', "Cache-Control": "max-age=0", "X-Version": str(self.requests)}
+        if handler.headers.get("If-None-Match") == '"v1"':
+            return Fixture(status=304, headers=headers)
+        return Fixture(b"<p>page</p>", headers=headers)
+
+class RevalidationTest(unittest.TestCase):
+    def setUp(self):
+        self.page = VersionedPage()
+        self.server = FixtureServer({"/page": self.page}).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.addCleanup(CONNECTION_POOL.close)
+
+        central = transferutil.CENTRAL_CACHE
+        self.addCleanup(setattr, transferutil, "CENTRAL_CACHE", central)
+        transferutil.CENTRAL_CACHE = Cache()
+        self.url = canonical_url(self.server.url("/page"))
+
+    def test_not_modified_replaces_the_headers_instead_of_changing_them(self):
+        response = transferutil.get(self.url)
+        headers = response.header._headers
+        old_headers = dict(headers)
+
+        revalidated = transferutil.get(self.url)
+        self.assertIs(revalidated, response)
+        self.assertEqual(response.get_header_value("x-version"), "2")
+        self.assertEqual(response.get_raw_body(), "<p>page</p>")
+        self.assertEqual(headers, old_headers)
+
+    def test_refreshes_the_cache_it_was_called_on(self):
+        transferutil.get(self.url)
+        central = transferutil.CENTRAL_CACHE
+        other = Cache()
+        other.put(self.url, central.map[self.url].value)
+        bytes_saved = central.bytes_saved
+
+        _, response = other.get(self.url)
+        self.assertEqual(self.page.requests, 2)
+        self.assertEqual(response.get_header_value("x-version"), "2")
+        self.assertGreater(other.bytes_saved, 0)
+        self.assertEqual(central.bytes_saved, bytes_saved)
@@ -0,0 +1,68 @@
+import threading, time, unittest
+
+from benchmark.server import Fixture, FixtureServer
+from response.response import HTTPResponse
+from transfer.socketutil import CONNECTION_POOL
+from transfer.transferutil import Cache, canonical_url, _value_size
+import transfer.transferutil as transferutil
+
+BODY = b"<p>Lorem ipsum <b>dolor</b> sit amet.</p>\n" * 200
+THREADS = 8
+
+def slow_page(handler):
+    time.sleep(0.2) # long enough for all the threads to miss at once
+    return Fixture(BODY, headers={"Cache-Control": "max-age=60"})
+
+def run_threads(count, target) -> list:
+    """
+    Start 'count' threads running target(i) together and return their results.
+    """
+    results = [None] * count
+    barrier = threading.Barrier(count)
+
+    def run(i):
+        barrier.wait()
+        results[i] = target(i)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+class SingleFlightTest(unittest.TestCase):
+    def setUp(self):
+        routes = {"/slow": slow_page}
+        routes.update(("/page{}".format(i), Fixture(BODY, headers={"Cache-Control": "max-age=60"}))
+                      for i in range(10))
+        self.server = FixtureServer(routes).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.addCleanup(CONNECTION_POOL.close)
+
+        central = transferutil.CENTRAL_CACHE
+        self.addCleanup(setattr, transferutil, "CENTRAL_CACHE", central)
+        transferutil.CENTRAL_CACHE = Cache()
+
+    def test_concurrent_misses_share_one_fetch(self):
+        url = canonical_url(self.server.url("/slow"))
+        responses = run_threads(THREADS, lambda i: transferutil.get(url))
+        self.assertEqual(self.server.hits["/slow"], 1)
+        self.assertEqual(len({id(response) for response in responses}), 1)
+        self.assertIsInstance(responses[0], HTTPResponse)
+        self.assertEqual(transferutil.CENTRAL_CACHE.in_flight, {})
+
+    def test_bookkeeping_stays_consistent_under_eviction(self):
+        urls = [canonical_url(self.server.url("/page{}".format(i))) for i in range(10)]
+        cache = transferutil.CENTRAL_CACHE
+        cache.max_bytes = 3 * _value_size({'response': HTTPResponse("HTTP/1.1 200 OK\r\n", {}, BODY.decode())})
+
+        def hammer(i):
+            for j in range(30):
+                transferutil.get(urls[(i + j) % len(urls)])
+        run_threads(THREADS, hammer)
+
+        self.assertEqual(cache.count, len(cache.map))
+        self.assertEqual(cache.size, sum(node.size for node in cache.map.values()))
+        self.assertLessEqual(cache.size, cache.max_bytes)
@@ -0,0 +1,80 @@
+import threading, time, unittest
+
+from transfer.socketutil import ConnectionPool
+
+class StubURL:
+    def __init__(self, host) -> None:
+        self.host = host
+
+    def get_scheme(self):
+        return "http"
+
+    def get_host(self):
+        return self.host
+
+    def get_port(self):
+        return 80
+
+class StubSocket:
+    """
+    A kept-alive connection that is never really connected.
+    """
+    def __init__(self, host) -> None:
+        self.scheme, self.host, self.port = "http", host, 80
+        self.last_used = time.monotonic()
+        self.connected = True
+
+    def is_idle_usable(self):
+        return self.connected
+
+    def save_tls_session(self):
+        pass
+
+    def disconnect(self):
+        self.connected = False
+
+class ConnectionPoolTest(unittest.TestCase):
+    def acquire_in_thread(self, pool, host, results):
+        thread = threading.Thread(target=lambda: results.setdefault(host, pool.acquire(StubURL(host))),
+                                  daemon=True)
+        thread.start()
+        return thread
+
+    def test_release_wakes_the_waiter_of_its_key(self):
+        pool = ConnectionPool(max_per_host=1)
+        pool.busy = {("http", "a.com", 80): 1, ("http", "b.com", 80): 1}
+        results = {}
+        waiting_b = self.acquire_in_thread(pool, "b.com", results)
+        time.sleep(0.05)
+        waiting_a = self.acquire_in_thread(pool, "a.com", results)
+        time.sleep(0.05)
+
+        sock = StubSocket("a.com")
+        pool.release(sock, reusable=True)
+        waiting_a.join(1)
+        self.assertEqual(results.get("a.com"), (sock, True))
+        self.assertTrue(waiting_b.is_alive())
+
+        pool.release(StubSocket("b.com"), reusable=True)
+        waiting_b.join(1)
+        self.assertIn("b.com", results)
+
+    def test_idle_connections_of_every_key_time_out(self):
+        pool = ConnectionPool(idle_timeout=30)
+        pool.busy = {("http", "a.com", 80): 1, ("http", "b.com", 80): 1}
+        old = StubSocket("a.com")
+        pool.release(old, reusable=True)
+        old.last_used -= 31
+
+        pool.release(StubSocket("b.com"), reusable=True)
+        self.assertFalse(old.connected)
+        self.assertNotIn(("http", "a.com", 80), pool.idle)
+
+    def test_close_disconnects_the_idle_connections(self):
+        pool = ConnectionPool()
+        pool.busy = {("http", "a.com", 80): 1}
+        sock = StubSocket("a.com")
+        pool.release(sock, reusable=True)
+        pool.close()
+        self.assertFalse(sock.connected)
+        self.assertEqual(pool.idle, {})
@@ -0,0 +1,55 @@
+import unittest
+
+from url.url import canonical_url, resolve_url, get_url_components
+
+class CanonicalUrlTest(unittest.TestCase):
+    def test_spellings_of_a_url_are_one(self):
+        for url in ["example.com", "http://example.com", "HTTP://Example.com:80/", "://example.com",
+                    "http://example.com/#top", "http://example.com/a/.."]:
+            self.assertEqual(canonical_url(url), "http://example.com/", url)
+
+    def test_port_query_and_dot_segments(self):
+        self.assertEqual(canonical_url("https://a.com:443/x/./y/../z?q=1#f"), "https://a.com/x/z?q=1")
+        self.assertEqual(canonical_url("http://a.com:8080"), "http://a.com:8080/")
+        self.assertEqual(canonical_url("http://a.com?x=1"), "http://a.com/?x=1")
+
+    def test_ipv6_host(self):
+        components = get_url_components("http://[::1]:8080/a")
+        self.assertEqual(components.get_host(), "::1")
+        self.assertEqual(components.get_port(), 8080)
+        self.assertEqual(components.get_netloc(), "[::1]:8080")
+        self.assertEqual(canonical_url("http://[::1]:80/a"), "http://[::1]/a")
+
+    def test_file_url(self):
+        self.assertEqual(canonical_url("FILE:///tmp/x"), "file:///tmp/x")
+
+    def test_invalid_scheme_and_port(self):
+        self.assertRaises(KeyError, canonical_url, "ftp://example.com/")
+        self.assertRaises(ValueError, canonical_url, "http://example.com:http/")
+
+class ResolveUrlTest(unittest.TestCase):
+    BASE = "http://h.com:81/a/b/c?q"
+
+    def test_references(self):
+        cases = {
+            "d": "http://h.com:81/a/b/d",
+            "../d": "http://h.com:81/a/d",
+            "./": "http://h.com:81/a/b/",
+            "/d": "http://h.com:81/d",
+            "?x": "http://h.com:81/a/b/c?x",
+            "#f": "http://h.com:81/a/b/c?q",
+            "": "http://h.com:81/a/b/c?q",
+            "//o.com/p": "http://o.com/p",
+            "https://X.com": "https://x.com/",
+        }
+        for reference, url in cases.items():
+            self.assertEqual(resolve_url(self.BASE, reference), url, reference)
+
+    def test_relative_reference_with_a_url_in_its_query(self):
+        self.assertEqual(resolve_url("http://example.com/a/b", "/login?next=http://example.com/x"),
+                         "http://example.com/login?next=http://example.com/x")
+        self.assertEqual(resolve_url("http://example.com/a/b", "login?next=https://x.com/"),
+                         "http://example.com/a/login?next=https://x.com/")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+from email.utils import parsedate_to_datetime
+import re, time
+
+__all__ = ['parse_cache_control', 'freshness_lifetime']
+
+"""
+One directive of a cache-control header: a name, optionally with a token or a
+quoted string argument, up to the comma that ends it. A quoted string may hold
+commas (e.g. no-cache="set-cookie, x-foo") and backslash-escaped characters.
+"""
+CACHE_DIRECTIVE = re.compile(r'\s*([^=,\s]*)\s*(?:=\s*("(?:[^"\\]|\\.)*"|[^,]*))?[^,]*(?:,|$)')
+QUOTED_PAIR = re.compile(r'\\(.)')
+
+def parse_cache_control(value: str) -> dict:
+    """
+    Parse a cache-control header value into a dictionary of lower-cased directives.
+    Directives with a number get an int, with a (possibly quoted) string get the string,
+    and the ones without a value get True. For example,
+        'max-age=60, no-cache="set-cookie", must-revalidate'
+    gives {'max-age': 60, 'no-cache': 'set-cookie', 'must-revalidate': True}.
+    The commas inside a quoted argument do not end the directive.
+    """
+    directives = {}
+    for match in CACHE_DIRECTIVE.finditer(value):
+        name, argument = match.group(1).lower(), match.group(2)
+        if not name:
+            continue
+        argument = (argument or "").strip()
+        if argument.startswith('"') and argument.endswith('"') and len(argument) > 1:
+            argument = QUOTED_PAIR.sub(r'\1', argument[1:-1])
+        if argument == "":
+            directives[name] = True
+        elif argument.isdigit():
+            directives[name] = int(argument)
+        else:
+            directives[name] = argument
+    return directives
+
+def freshness_lifetime(headers: dict, directives: dict):
+    """
+    Return for how many seconds (from its generation) a response with the headers
+    and the cache-control directives is fresh, None if it does not say.
+
+    max-age wins over the expires header, which is taken relative to the date header.
+    An expires header that cannot be parsed means the response is already expired.
+    s-maxage only applies to shared caches, and the browser cache is a private one.
+    """
+    if isinstance(directives.get('max-age'), int):
+        return directives['max-age']
+    if 'expires' not in headers:
+        return None
+    try:
+        expires = parsedate_to_datetime(headers['expires'])
+        if 'date' in headers:
+            date = parsedate_to_datetime(headers['date'])
+            return max(0, int((expires - date).total_seconds()))
+        return max(0, int(expires.timestamp() - time.time()))
+    except (TypeError, ValueError):
+        return 0
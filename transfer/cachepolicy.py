@@ -0,0 +1,190 @@
+from collections import OrderedDict
+from util import raiseNotDefined
+import heapq, itertools
+
+__all__ = ['CacheNode', 'EvictionPolicy', 'LRUPolicy', 'LFUPolicy', 'GDSFPolicy', 'POLICIES']
+
+class CacheNode:
+    """
+    A slot in the cache.
+    pre  : The previous cache slot in the cache (see LRUPolicy)
+    next : The next cache slot in the cache (see LRUPolicy)
+    key  : Identifier for the value (see class Cache)
+    value: What the cache stores for this specific key. In cache implementation, it is
+           a dictionary of request.request.HTTPRequest object and response.response.HTTPResponse
+           object. If the cache has expiration time, the remaining time is also added to the dictionary.
+    size : The bytes the value takes in memory.
+    frequency, priority: Bookkeeping of the policies that need it (see LFUPolicy and GDSFPolicy).
+    """
+    def __init__(self, key, value: dict, size=0) -> None:
+        self.pre: CacheNode = None
+        self.next: CacheNode = None
+        self.key = key
+        self.value = value
+        self.size = size
+        self.frequency = 0
+        self.priority = None
+
+class EvictionPolicy:
+    """
+    Decides which cache node the cache evicts when it is over its budget.
+    The cache tells the policy about every node it adds, uses and removes.
+    """
+    def add(self, node: CacheNode):
+        raiseNotDefined()
+
+    def touch(self, node: CacheNode):
+        """
+        The node was used (looked up or replaced).
+        """
+        raiseNotDefined()
+
+    def remove(self, node: CacheNode):
+        raiseNotDefined()
+
+    def victim(self) -> CacheNode:
+        """
+        Return the node to evict next. The cache removes it with self.remove(node).
+        """
+        raiseNotDefined()
+
+class LRUPolicy(EvictionPolicy):
+    """
+    Least recently used first. The nodes are kept in a circular doubly linked list.
+    Cache nodes 'head' and 'tail' are to facilitate the access to the first and last
+    "actual" cache nodes in the list.
+
+    The further from the head node, the less the node is recently used
+    with the head.next being the most recent and the tail.pre being
+    the least recently used.
+    """
+    def __init__(self) -> None:
+        self.head = CacheNode(None, None)
+        self.tail = CacheNode(None, None)
+
+        self.head.next = self.tail
+        self.head.pre = None
+        self.tail.next = None
+        self.tail.pre = self.head
+
+    def add(self, node: CacheNode):
+        self._add_to_head(node)
+
+    def touch(self, node: CacheNode):
+        self._delete(node)
+        self._add_to_head(node)
+
+    def remove(self, node: CacheNode):
+        self._delete(node)
+
+    def victim(self) -> CacheNode:
+        return self.tail.pre
+
+    def _delete(self, node: CacheNode):
+        """
+        Delete a cache slot from the list by changing its
+        pointers.
+        """
+        node.pre.next = node.next
+        node.next.pre = node.pre
+
+    def _add_to_head(self, node: CacheNode):
+        """
+        Move the node to head.next effectively making it the most recent
+        used cache node. The subsequent cache nodes' recent usages are moved back
+        inherently.
+
+        WARNING: This function only changes the next's and pre's of the input node and
+        the head. node.pre.next and node.next.pre are still pointing to the node.
+        Call self._delete(node) if neccessary.
+        """
+        node.next = self.head.next
+        self.head.next.pre = node
+
+        node.pre = self.head
+        self.head.next = node
+
+class LFUPolicy(EvictionPolicy):
+    """
+    Least frequently used first, the least recently used among equally frequent nodes.
+    The nodes are kept in one insertion-ordered bucket per use count.
+    """
+    def __init__(self) -> None:
+        self.buckets: dict[int, OrderedDict] = {}
+
+    def add(self, node: CacheNode):
+        node.frequency = 1
+        self.buckets.setdefault(1, OrderedDict())[node.key] = node
+
+    def touch(self, node: CacheNode):
+        self.remove(node)
+        node.frequency += 1
+        self.buckets.setdefault(node.frequency, OrderedDict())[node.key] = node
+
+    def remove(self, node: CacheNode):
+        bucket = self.buckets[node.frequency]
+        del bucket[node.key]
+        if not bucket:
+            del self.buckets[node.frequency]
+
+    def victim(self) -> CacheNode:
+        bucket = self.buckets[min(self.buckets)]
+        return next(iter(bucket.values()))
+
+class GDSFPolicy(EvictionPolicy):
+    """
+    Greedy-Dual-Size-Frequency: every node has the priority L + frequency / size and
+    the lowest priority is evicted first, so large rarely used responses go before
+    small popular ones. L is the priority of the last victim; adding it to new
+    priorities ages the nodes that have not been used since.
+
+    The nodes are kept in a heap. A used node is pushed again with its new priority
+    and the outdated entries are skipped when they come up. Once the outdated entries
+    outnumber the nodes, the heap is rebuilt without them, so a cache that is never
+    full does not grow its heap on every lookup or keep removed nodes alive.
+    """
+    def __init__(self) -> None:
+        self.heap = []
+        self.nodes = 0
+        self.inflation = 0 # L
+        self.counter = itertools.count() # breaks ties in insertion order
+
+    def add(self, node: CacheNode):
+        node.frequency = 1
+        self.nodes += 1
+        self._push(node)
+
+    def touch(self, node: CacheNode):
+        node.frequency += 1
+        self._push(node)
+
+    def remove(self, node: CacheNode):
+        node.priority = None
+        self.nodes -= 1
+        self._compact()
+
+    def victim(self) -> CacheNode:
+        while True:
+            priority, _, node = self.heap[0]
+            if node.priority == priority:
+                self.inflation = priority
+                return node
+            heapq.heappop(self.heap)
+
+    def _push(self, node: CacheNode):
+        node.priority = self.inflation + node.frequency / max(node.size, 1)
+        heapq.heappush(self.heap, (node.priority, next(self.counter), node))
+        self._compact()
+
+    def _compact(self):
+        """
+        Drop the outdated entries once there are more of them than nodes.
+        """
+        if len(self.heap) > 2 * self.nodes + 1:
+            self.heap = [entry for entry in self.heap if entry[2].priority == entry[0]]
+            heapq.heapify(self.heap)
+
+"""
+The policies by name.
+"""
+POLICIES = {'lru': LRUPolicy, 'lfu': LFUPolicy, 'gdsf': GDSFPolicy}
@@ -0,0 +1,271 @@
+import atexit, hashlib, json, os, tempfile, threading, time, zlib
+
+__all__ = ['DiskCache']
+
+"""
+The journal is folded into the index once it has this many lines (see DiskCache).
+"""
+JOURNAL_LIMIT = 1000
+
+"""
+A body file no entry refers to is only removed once it is this old (in seconds): a
+younger one may belong to an entry another process is writing.
+"""
+ORPHAN_AGE = 60 * 60
+
+class DiskCache:
+    """
+    The on-disk tier of the browser cache, so cached responses outlive the process.
+
+    Every entry is a record (a dictionary) of the status line, the headers, the
+    'expires-at' time and the body of a response. The body is stored compressed in
+    'bodies/', in a file named after the hash of its content so equal bodies share
+    one file. The rest of the records are kept in 'index.json', keyed like the
+    memory cache.
+
+    The index is not rewritten on every change: puts, updates and removals are
+    appended to 'journal' as one JSON line each and replayed over the index when it
+    is loaded. Once the journal has JOURNAL_LIMIT lines (and when the process
+    exits), it is folded into a new index.json and emptied.
+
+    Writes are crash-safe: body files and the index are written to a temporary file
+    first and moved in place with os.replace, bodies before the journal line that
+    refers to them. A crash can leave a torn last journal line, which is ignored,
+    or an unreferenced body file, which is removed once it is ORPHAN_AGE old.
+
+    Several processes may share the directory without corrupting it, but the index
+    one of them writes does not have the entries only the other ones know, so
+    their entries can be lost.
+
+    The total size of the body files is bounded by 'max_bytes'; the least recently
+    used entries are evicted first. If the directory cannot be used at all, the disk
+    cache silently stays empty rather than failing the fetches.
+
+    The public methods hold 'lock', so the disk cache can be used from several threads.
+    """
+    def __init__(self, directory: str, max_bytes=100 * 1024 * 1024) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index: dict[str, dict] = None # loaded on first use
+        self.refs: dict[str, int] = {} # body digest -> entries that refer to it
+        self.total = 0 # bytes of the body files the index refers to
+        self.journal_lines = 0
+        self.dirty = False # the index has access times that are not saved yet
+        self.usable = True
+        self.lock = threading.RLock()
+
+    def get(self, key) -> dict:
+        """
+        Return the record of the key with its body, None if the key is not on disk.
+        """
+        with self.lock:
+            if not self._load():
+                return None
+            entry = self.index.get(key)
+            if entry is None:
+                return None
+            try:
+                with open(self._body_path(entry['body']), 'rb') as f:
+                    body = zlib.decompress(f.read()).decode('utf8')
+            except (OSError, zlib.error):
+                self._pop(key)
+                self._append({'key': key, 'entry': None})
+                return None
+
+            entry['last-access'] = time.time()
+            self.dirty = True
+            record = dict(entry)
+            record['body'] = body
+            return record
+
+    def put(self, key, record: dict):
+        """
+        Store the record (see the class docstring) of the key, evicting the least
+        recently used entries if the cache grows over max_bytes.
+        """
+        # Compressed before taking the lock: it is the slow part.
+        data = zlib.compress(record['body'].encode('utf8'))
+        digest = hashlib.sha256(data).hexdigest()
+        with self.lock:
+            if not self._load():
+                return
+            if not os.path.exists(self._body_path(digest)):
+                try:
+                    self._write_atomic(self._body_path(digest), data)
+                except OSError:
+                    return
+
+            entry = dict(record)
+            entry['body'] = digest
+            entry['size'] = len(data)
+            entry['last-access'] = time.time()
+            self._pop(key)
+            self._set(key, entry)
+            self._append({'key': key, 'entry': entry})
+            self._evict()
+
+    def update(self, key, fields: dict):
+        """
+        Change record fields other than the body (e.g. the headers and 'expires-at'
+        after a revalidation) without rewriting the body.
+        """
+        with self.lock:
+            if not self._load() or key not in self.index:
+                return
+            self.index[key].update(fields)
+            self._append({'key': key, 'entry': self.index[key]})
+
+    def flush(self):
+        """
+        Fold the journal and the access times into a new index if they changed.
+        """
+        with self.lock:
+            if self.index is not None and self.usable and (self.dirty or self.journal_lines):
+                try:
+                    self._save_index()
+                except OSError:
+                    pass
+
+    def _evict(self):
+        """
+        Drop the least recently used entries until the body files fit in max_bytes.
+        """
+        if self.total <= self.max_bytes:
+            return
+        by_access = sorted(self.index.items(), key=lambda item: item[1]['last-access'])
+        for key, entry in by_access:
+            if self.total <= self.max_bytes:
+                break
+            self._pop(key)
+            self._append({'key': key, 'entry': None})
+            if entry['body'] not in self.refs:
+                self._remove(self._body_path(entry['body']))
+
+    def _set(self, key, entry):
+        self.index[key] = entry
+        digest = entry['body']
+        if digest not in self.refs:
+            self.refs[digest] = 0
+            self.total += entry['size']
+        self.refs[digest] += 1
+
+    def _pop(self, key):
+        entry = self.index.pop(key, None)
+        if entry is None:
+            return
+        digest = entry['body']
+        self.refs[digest] -= 1
+        if self.refs[digest] == 0:
+            del self.refs[digest]
+            self.total -= entry['size']
+
+    def _load(self):
+        """
+        Load the index and replay the journal the first time they are needed, and
+        remove what a crash may have left: old temporary files and body files that
+        no entry refers to. Return if the disk cache is usable.
+        """
+        if self.index is not None:
+            return self.usable
+        self.index = {}
+        try:
+            os.makedirs(os.path.join(self.directory, 'bodies'), exist_ok=True)
+        except OSError:
+            self.usable = False
+            return False
+        self.usable = True
+        try:
+            with open(self._index_path(), 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        for key, entry in index.items():
+            try:
+                self._set(key, entry)
+            except (KeyError, TypeError):
+                self.index.pop(key, None) # not an entry this cache wrote
+        self._replay_journal()
+
+        for name in os.listdir(self.directory):
+            if name.startswith('.tmp-'):
+                self._remove_orphan(os.path.join(self.directory, name))
+        for name in os.listdir(os.path.join(self.directory, 'bodies')):
+            if name not in self.refs:
+                self._remove_orphan(os.path.join(self.directory, 'bodies', name))
+        atexit.register(self.flush)
+        return True
+
+    def _replay_journal(self):
+        try:
+            with open(self._journal_path(), 'r') as f:
+                lines = f.readlines()
+        except OSError:
+            return
+        for line in lines:
+            try:
+                change = json.loads(line)
+                self._pop(change['key'])
+                if change['entry'] is not None:
+                    self._set(change['key'], change['entry'])
+            except (ValueError, KeyError, TypeError):
+                continue # torn by a crash
+        self.journal_lines = len(lines)
+
+    def _append(self, change: dict):
+        """
+        Append the change to the journal, or fold everything into a new index
+        once the journal is long enough.
+        """
+        try:
+            if self.journal_lines + 1 >= JOURNAL_LIMIT:
+                self._save_index()
+                return
+            with open(self._journal_path(), 'a') as f:
+                f.write(json.dumps(change) + "\n")
+            self.journal_lines += 1
+        except OSError:
+            self.dirty = True # the change stays in memory and is saved with the next index
+
+    def _save_index(self):
+        self._write_atomic(self._index_path(), json.dumps(self.index).encode('utf8'))
+        self._remove(self._journal_path())
+        self.journal_lines = 0
+        self.dirty = False
+
+    def _write_atomic(self, path, data: bytes):
+        """
+        Write the data to a temporary file next to the path and move it in place,
+        so the path either has its old content or all of the new one.
+        """
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            self._remove(tmp)
+            raise
+
+    def _remove_orphan(self, path):
+        try:
+            if os.path.getmtime(path) < time.time() - ORPHAN_AGE:
+                os.remove(path)
+        except OSError:
+            pass
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _index_path(self):
+        return os.path.join(self.directory, 'index.json')
+
+    def _journal_path(self):
+        return os.path.join(self.directory, 'journal')
+
+    def _body_path(self, digest):
+        return os.path.join(self.directory, 'bodies', digest)
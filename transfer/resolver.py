@@ -0,0 +1,143 @@
+import errno, select, socket, threading, time
+
+__all__ = ['Resolver', 'RESOLVER', 'interleave_families', 'connect_first']
+
+class Resolver:
+    """
+    Resolves host names with getaddrinfo and remembers the addresses for 'ttl'
+    seconds, so a page load does not pay a DNS lookup per request. getaddrinfo
+    does not tell the TTL of the DNS records, so one fixed TTL is used for all.
+    Failed lookups are not remembered.
+
+    At most 'max_entries' names are kept, the oldest lookup is dropped first.
+    'getaddrinfo' can be replaced, e.g. by a stub resolver in tests.
+    """
+    def __init__(self, ttl=60, max_entries=256, getaddrinfo=socket.getaddrinfo) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.getaddrinfo = getaddrinfo
+        self.entries: dict[tuple, tuple] = {} # key -> (expires-at, addresses)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.lookups = 0
+
+    def resolve(self, host, port, family=socket.AF_UNSPEC, type=socket.SOCK_STREAM) -> list:
+        """
+        Return the getaddrinfo tuples (family, type, proto, canonname, sockaddr) of
+        the host, in the order to try them (see interleave_families).
+        Raise socket.gaierror if the host cannot be resolved.
+        """
+        key = (host, port, family, type)
+        with self.lock:
+            self.lookups += 1
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+
+        # Resolved without the lock: a lookup can take long and other hosts should not wait.
+        addresses = interleave_families(self.getaddrinfo(host, port, family, type))
+        with self.lock:
+            self.entries.pop(key, None)
+            if len(self.entries) >= self.max_entries:
+                del self.entries[next(iter(self.entries))]
+            self.entries[key] = (time.monotonic() + self.ttl, addresses)
+        return addresses
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+def interleave_families(addresses) -> list:
+    """
+    Order the addresses alternating between the address families, starting with
+    the family of the first one (RFC 8305 section 4), so that if one family is
+    broken the next attempt is already on the other one.
+    """
+    by_family = {}
+    for address in addresses:
+        by_family.setdefault(address[0], []).append(address)
+    queues = list(by_family.values())
+    ordered = []
+    while queues:
+        for queue in queues:
+            ordered.append(queue.pop(0))
+        queues = [queue for queue in queues if queue]
+    return ordered
+
+"""
+Happy Eyeballs (RFC 8305): the next address is tried if the previous attempts
+have not connected after CONNECT_ATTEMPT_DELAY seconds, and the whole connect
+gives up after CONNECT_TIMEOUT seconds.
+"""
+CONNECT_ATTEMPT_DELAY = 0.25
+CONNECT_TIMEOUT = 30
+
+IN_PROGRESS = {errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN, errno.EALREADY}
+
+def connect_first(addresses, delay=CONNECT_ATTEMPT_DELAY, timeout=CONNECT_TIMEOUT) -> socket.socket:
+    """
+    Connect to the first of the addresses (getaddrinfo tuples) that answers and
+    return the connected, blocking socket. The attempts are started 'delay'
+    seconds apart (at once when an attempt fails) and run in parallel, so a dead
+    address costs 'delay' instead of a full connect timeout. The other attempts
+    are closed.
+
+    Raise the error of the attempt if there was only one, an OSError listing all
+    of them otherwise, and TimeoutError after 'timeout' seconds.
+    """
+    remaining = list(addresses)
+    pending: dict[socket.socket, tuple] = {}
+    errors = []
+    winner = None
+    deadline = time.monotonic() + timeout
+    next_attempt = time.monotonic()
+    try:
+        while winner is None and (remaining or pending):
+            now = time.monotonic()
+            if now >= deadline:
+                raise TimeoutError("Connecting timed out after {} seconds".format(timeout))
+
+            if remaining and (now >= next_attempt or not pending):
+                family, type, proto, _, sockaddr = remaining.pop(0)
+                sock = socket.socket(family, type, proto)
+                sock.setblocking(False)
+                error = sock.connect_ex(sockaddr)
+                if error == 0:
+                    winner = sock
+                    break
+                if error in IN_PROGRESS:
+                    pending[sock] = sockaddr
+                    next_attempt = now + delay
+                else:
+                    sock.close()
+                    errors.append(OSError(error, "{} ({})".format(errno.errorcode.get(error, error), sockaddr)))
+                continue
+
+            wake = min(next_attempt, deadline) if remaining else deadline
+            _, writable, _ = select.select([], list(pending), [], max(0, wake - time.monotonic()))
+            for sock in writable:
+                sockaddr = pending.pop(sock)
+                error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if error == 0 and winner is None:
+                    winner = sock
+                    continue
+                sock.close()
+                if error:
+                    errors.append(OSError(error, "{} ({})".format(errno.errorcode.get(error, error), sockaddr)))
+                    next_attempt = time.monotonic() # a failure starts the next attempt at once
+    finally:
+        for sock in pending:
+            sock.close()
+
+    if winner is None:
+        if len(errors) == 1:
+            raise errors[0]
+        raise OSError("All connection attempts failed: " + "; ".join(str(error) for error in errors))
+    winner.setblocking(True)
+    return winner
+
+"""
+The resolver of the browser
+"""
+RESOLVER = Resolver()
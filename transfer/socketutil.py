@@ -1,36 +1,64 @@
-import socket, ssl
+import atexit, socket, ssl, select, threading, time
 from io import BufferedReader
 from typing import Union
 
 from url.url import *
+from data.connection import stage
+from transfer.resolver import RESOLVER, connect_first
+
+_SSL_CONTEXT = None
+_SSL_CONTEXT_LOCK = threading.Lock()
+
+def get_ssl_context() -> ssl.SSLContext:
+    """
+    Return the process-wide SSL context, created (and the CA bundle loaded) 
+    on first use only. Sessions can only be resumed through the context that
+    created them, which is one more reason to share it.
+    """
+    global _SSL_CONTEXT
+    with _SSL_CONTEXT_LOCK:
+        if _SSL_CONTEXT is None:
+            _SSL_CONTEXT = ssl.create_default_context()
+        return _SSL_CONTEXT
+
+"""
+The last TLS session per (host, port) for abbreviated handshakes.
+"""
+TLS_SESSIONS: dict[tuple, ssl.SSLSession] = {}
 
 class Socket:
     """
     Implemented based on https://docs.python.org/3/howto/sockets.html
+
+    The socket itself is created by connect, in the family of the address of the
+    host that answered first: IPv4 or IPv6 unless 'family' restricts it.
     """
-    def __init__(self, family=socket.AF_INET, type=socket.SOCK_STREAM, proto=socket.IPPROTO_TCP) -> None:
+    def __init__(self, family=socket.AF_UNSPEC, type=socket.SOCK_STREAM, proto=socket.IPPROTO_TCP) -> None:
         self.family = family
         self.type = type
         self.proto = proto
-
-        self.socket = socket.socket(
-            family=self.family,
-            type=self.type,
-            proto=self.proto,
-        )
+        self.socket: socket.socket = None
 
     def connect(self, components):
-        assert self.family == socket.AF_INET
-        print(components.get_original_url())
         self.host = components.get_host()
         self.port = components.get_port()
         self.scheme = components.get_scheme()
 
-        self.socket.connect((self.host, self.port))
+        with stage("dns", host=self.host):
+            addresses = RESOLVER.resolve(self.host, self.port, self.family, self.type)
+        with stage("connect", host=self.host, port=self.port) as args:
+            self.socket = connect_first(addresses)
+            args["address"] = self.socket.getpeername()[0]
+            self.family = self.socket.family
 
         if self.scheme == Scheme.https:
-            ctx = ssl.create_default_context()
-            self.socket = ctx.wrap_socket(self.socket, server_hostname=self.host)
+            with stage("tls") as args:
+                ctx = get_ssl_context()
+                session = TLS_SESSIONS.get((self.host, self.port))
+                self.socket = ctx.wrap_socket(self.socket, server_hostname=self.host, session=session)
+                args["resumed"] = self.socket.session_reused
+        self.stream = None
+        self.last_used = time.monotonic()
                 
     def send(self, msg: Union[str, bytes]):
         if isinstance(msg, str):
@@ -46,12 +74,145 @@ class Socket:
         assert totalSent == len(msg)
     
     def receive(self) -> BufferedReader:
-        return self.socket.makefile("rb", newline="\r\n")
+        """
+        Return the buffered stream of the socket. The same stream is returned
+        for every response on the connection so nothing read ahead is lost 
+        between responses on a kept-alive connection.
+        """
+        if self.stream is None:
+            self.stream = self.socket.makefile("rb", newline="\r\n")
+        return self.stream
     
+    def is_idle_usable(self) -> bool:
+        """
+        Return if an idle connection can still carry a request. An idle socket
+        that is readable has either been closed by the server or has stray data
+        on it; it is unusable in both cases.
+        """
+        readable, _, _ = select.select([self.socket], [], [], 0)
+        return not readable
+
+    def save_tls_session(self):
+        """
+        Remember the TLS session of the connection so the next connection to the
+        same host and port can resume it. With TLS 1.3 the session ticket only
+        arrives after the handshake, so this is best called once a response is read.
+        """
+        if isinstance(self.socket, ssl.SSLSocket) and self.socket.session is not None:
+            TLS_SESSIONS[(self.host, self.port)] = self.socket.session
+
     def disconnect(self):
-        self.socket.shutdown(socket.SHUT_RDWR)
+        self.save_tls_session()
+        if self.stream is not None:
+            self.stream.close()
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass # already closed by the server
         self.socket.close()
 
+class ConnectionPool:
+    """
+    Keeps the kept-alive sockets of finished responses so later requests to the
+    same (scheme, host, port) can skip the TCP (and TLS) handshake.
+
+    At most 'max_per_host' connections (busy or idle) are open per key; acquire
+    waits for one to be released beyond that. The waiters of all the keys share
+    one condition, so a release wakes them all and each checks its own key.
+    Idle connections older than 'idle_timeout' seconds are closed, for every key,
+    whenever a connection is acquired or released.
+    """
+    def __init__(self, max_per_host=6, idle_timeout=30) -> None:
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+
+        self.idle: dict[tuple, list[Socket]] = {} # most recently used last
+        self.busy: dict[tuple, int] = {}
+        self.condition = threading.Condition()
+
+    def acquire(self, components: HttpURL) -> tuple:
+        """
+        Return a (socket, reused) tuple of a connected socket for the components,
+        reusing an idle connection if there is one.
+        """
+        key = self._key(components)
+        with self.condition:
+            while True:
+                self._evict_idle()
+                idle = self.idle.get(key, [])
+                while idle:
+                    sock = idle.pop()
+                    if sock.is_idle_usable():
+                        self.busy[key] = self.busy.get(key, 0) + 1
+                        return sock, True
+                    sock.disconnect()
+                if self.busy.get(key, 0) < self.max_per_host:
+                    self.busy[key] = self.busy.get(key, 0) + 1
+                    break
+                self.condition.wait()
+
+        try:
+            sock = Socket()
+            sock.connect(components)
+        except BaseException:
+            self._forget(key)
+            raise
+        return sock, False
+
+    def release(self, sock: Socket, reusable: bool):
+        """
+        Give back a socket from acquire. A reusable socket is kept idle for the next 
+        request to the same key, the others are disconnected.
+        """
+        key = (sock.scheme, sock.host, sock.port)
+        if reusable:
+            sock.save_tls_session()
+            sock.last_used = time.monotonic()
+            with self.condition:
+                self._evict_idle()
+                self.idle.setdefault(key, []).append(sock)
+                self.busy[key] -= 1
+                self.condition.notify_all()
+        else:
+            sock.disconnect()
+            self._forget(key)
+
+    def close(self):
+        """
+        Disconnect every idle connection.
+        """
+        with self.condition:
+            for sockets in self.idle.values():
+                for sock in sockets:
+                    sock.disconnect()
+            self.idle.clear()
+
+    def _forget(self, key):
+        with self.condition:
+            self.busy[key] -= 1
+            self.condition.notify_all()
+
+    def _evict_idle(self):
+        """
+        Disconnect the idle connections that outlived the idle timeout, of every key:
+        the ones of a host that is not requested again would stay open otherwise.
+        """
+        deadline = time.monotonic() - self.idle_timeout
+        for key, idle in list(self.idle.items()):
+            while idle and idle[0].last_used < deadline:
+                idle.pop(0).disconnect()
+            if not idle:
+                del self.idle[key]
+
+    def _key(self, components: HttpURL) -> tuple:
+        return (components.get_scheme(), components.get_host(), components.get_port())
+
+"""
+The pool of kept-alive connections of the browser
+"""
+CONNECTION_POOL = ConnectionPool()
+atexit.register(CONNECTION_POOL.close)
+
 
 
 
@@ -1,144 +1,419 @@
-from transfer.socketutil import Socket
+from transfer.socketutil import CONNECTION_POOL, get_ssl_context
+from transfer.diskcache import DiskCache
+from transfer.cachepolicy import *
+from transfer.cachecontrol import *
 from request.request import *
 from response.response import *
 from url.url import *
+from data.connection import stage, current_trace
 from typing import Union
 
-import re, time
+import asyncio, io, os, sys, threading, time
 
-__all__ = ['get']
-
-class CacheNode:
-    """
-    A slot in the LRU cache because the cache will be designed as a circular doubly linked list.
-    pre  : The previous cache slot in the cache
-    next : The next cache slot in the cache
-    key  : Identifier for the value (see class Cache)
-    value: What the cache stores for this specific key. In cache implementation, it is
-           a dictionary of request.request.HTTPRequest object and response.response.HTTPResponse
-           object. If the cache has expiration time, the remaining time is also added to the dictionary.
-    """
-    def __init__(self, key, value: dict) -> None:
-        self.pre: CacheNode = None
-        self.next: CacheNode = None
-        self.key = key
-        self.value = value
+__all__ = ['get', 'async_get', 'fetch_all']
 
 class Cache:
     """
-    The LRU cache with 'capacity' slots. Cache nodes 'head' and 'tail' are to facilitate 
-    the access to the first and last "actual" cache nodes in the cache. 
-    
-    The further from the head node, the less the node is recently used 
-    with the head.next being the most recent and the tail.next being
-    the least recently used.
+    The in-memory cache of (request, response) values, bounded by 'max_bytes' of
+    bodies and headers (and by 'capacity' entries, if given). When it is over its
+    budget, the eviction 'policy' (a transfer.cachepolicy.EvictionPolicy or the name
+    of one in POLICIES: "lru", "lfu" or "gdsf") picks the cache nodes to drop.
 
     The attribute 'self.map' saves a dictionary of (url, corresponding cache nodes) to provide 
-    fast access to any cache node in the cache rather than simple first and last cache nodes that
-    is provided by the 'self.head' and 'self.tail'. Cache nodes also need to keep their own keys
-    because we need the key to find in the map after we identify the least recently used cache node
-    through tail.pre (see self.put(key, value)).
+    fast access to any cache node in the cache. Cache nodes also need to keep their own keys
+    because we need the key to find in the map after the policy picks a victim node.
+
+    'cache_hit' / 'cache_access' is the hit ratio (see hit_ratio()) and 'bytes_saved'
+    counts the bytes of the responses served from the cache instead of the network.
+
+    With a DiskCache as 'disk', everything put in the cache is also written to disk and
+    a key missing in memory is looked up on disk before being fetched from the internet.
+
+    'self.redirects' remembers the cacheable redirects (see put_redirect), so a key
+    that redirected before is looked up (or fetched) at its final location at once.
+    'redirect_hops' counts the redirects taken from it instead of the network.
+
+    The cache is safe to use from several threads. 'lock' guards the map, the policy
+    and the counters; it is never held while fetching, so it is one lock rather than
+    one per key (the eviction policy orders all the keys anyway). Concurrent misses
+    of one key share a single fetch (see _single_flight).
     """
-    def __init__(self, capacity=10) -> None:
+    def __init__(self, capacity=None, max_bytes=64 * 1024 * 1024, policy="lru",\
+                 disk: DiskCache = None) -> None:
         self.capacity = capacity
-        self.count = 0 # current capacity
+        self.max_bytes = max_bytes
+        self.policy: EvictionPolicy = POLICIES[policy]() if isinstance(policy, str) else policy
+        self.disk = disk
+        self.count = 0 # current number of cache nodes
+        self.size = 0 # current bytes of the cache nodes
 
         self.cache_hit = 0
         self.cache_access = 0
+        self.bytes_saved = 0
         
-        self.head = CacheNode(None, None)
-        self.tail = CacheNode(None, None)
-
-        self.head.next = self.tail
-        self.head.pre = None
-        self.tail.next = None
-        self.tail.pre = self.head
         self.map: dict[str, CacheNode] = {}
+        self.revalidating = set() # keys being revalidated in the background
+        self.in_flight: dict[str, Flight] = {} # keys being fetched
+        self.redirects: dict[str, tuple] = {} # key -> (location, expires-at)
+        self.redirect_hops = 0
+        self.lock = threading.RLock()
 
-    def get(self, key) -> tuple:
+    def get(self, key, parser: HTMLParser = None) -> tuple:
         """
         Retrieve the cache node using the key while updating 
-        according to the LRU policy.
+        the eviction policy.
         If the cache misses or the cache nodes expires, the cache retrieves
         the resources from the internet with self._cache_miss_get(key).
-        """
-        self.cache_access += 1
+        An expired cache node with validators (ETag or Last-Modified) is revalidated
+        with the server instead, reusing the cached body if it is still current.
+        The parser, if any, is fed the body of the fetched page as it arrives.
 
-        if key in self.map.keys():
-            node = self.map[key]
-            value = node.value
-            if self._is_resource_fresh(value):
+        Expired cache nodes are still served when the response allows it:
+        within its stale-while-revalidate window the stale response is returned
+        at once while it is revalidated in the background, and within its 
+        stale-if-error window it is returned if the network fails.
+
+        A key that is remembered to redirect is replaced by its final location first.
+        """
+        key = self.resolve_redirect(key)
+        value = self.lookup(key)
+        if value is not None:
+            trace = current_trace()
+            if trace is not None:
+                trace.add("from_cache", True)
+            return value['request'], value['response']
+
+        stale = self._stale_lookup(key)
+        if stale is None:
+            return self._single_flight(key, lambda: _cache_miss_get(key, parser))
+
+        if _may_serve_stale(stale, 'stale-while-revalidate-until'):
+            with self.lock:
                 self.cache_hit += 1
-                self._delete(node)
-                self._add_to_head(node)
-                return value['request'], value['response']
-        return _cache_miss_get(key)
+                self.bytes_saved += _value_size(stale)
+            self._revalidate_in_background(key, stale)
+            return stale['request'], stale['response']
+
+        try:
+            req, res = self._single_flight(key, lambda: _refetch(self, key, stale, parser))
+        except OSError:
+            if _may_serve_stale(stale, 'stale-if-error-until'):
+                return stale['request'], stale['response']
+            raise
+        if res.get_status_code() in SERVER_ERRORS and (parser is None or parser.received == 0) \
+            and _may_serve_stale(stale, 'stale-if-error-until'):
+            return stale['request'], stale['response']
+        return req, res
+
+    def lookup(self, key) -> dict:
+        """
+        Return the cached value of the key if it is fresh (updating the eviction policy), 
+        None otherwise. Nothing is fetched on a miss.
+        """
+        with self.lock:
+            self.cache_access += 1
+
+            if key in self.map.keys():
+                node = self.map[key]
+                value = node.value
+                if self._is_resource_fresh(value):
+                    self.cache_hit += 1
+                    self.bytes_saved += node.size
+                    self.policy.touch(node)
+                    return value
+
+        if self.disk is not None:
+            value = self._disk_lookup(key)
+            if value is not None:
+                with self.lock:
+                    self.cache_hit += 1
+                    self.bytes_saved += _value_size(value)
+                    self._put_in_memory(key, value)
+                return value
+        return None
+
+    def hit_ratio(self) -> float:
+        return self.cache_hit / self.cache_access if self.cache_access else 0.0
     
     def put(self, key, value):
         """
-        Put the key-value pair in the self.map and to the next of the head.
-        If the self.map is full, remove the least recently used cache node.
+        Put the key-value pair in the self.map and tell the eviction policy.
+        If the cache goes over its budget, evict the cache nodes the policy picks.
+        The pair is written to the disk tier as well, if there is one.
         """
-        if key in self.map.keys():
-            node = self.map[key]
-            node.value = value
-            self._delete(node)
-            self._add_to_head(node)
-        else:
-            node = CacheNode(key, value)
-            self.map[key] = node
-            if self.count < self.capacity:
-                self._add_to_head(node)
-            else:
-                self.map.pop(self.tail.pre.key, None)
-                self._delete(self.tail.pre)
-                self._add_to_head(node)
-    
-    def _is_resource_fresh(self, resource):
+        self._put_in_memory(key, value)
+        if self.disk is not None:
+            res = value['response']
+            record = {field: value[field] for field in FRESHNESS_FIELDS}
+            record['status-line'] = res.get_status_line()
+            record['headers'] = res.header._headers
+            record['body'] = res.get_raw_body()
+            self.disk.put(key, record)
+
+    def refresh(self, key, value):
         """
-        Return if the cache node has not expired.
+        Put a value whose response body did not change (e.g. after a revalidation):
+        only the headers and the expiry are written to the disk tier.
         """
-        return 'expires-at' in resource and resource['expires-at'] > time.time()
+        with self.lock:
+            self.bytes_saved += _value_size(value)
+            self._put_in_memory(key, value)
+        if self.disk is not None:
+            record = {field: value[field] for field in FRESHNESS_FIELDS}
+            record['headers'] = value['response'].header._headers
+            self.disk.update(key, record)
+
+    def put_redirect(self, key, location, expires_at):
+        """
+        Remember that the key redirects to the location until expires_at (seconds
+        since the epoch). A redirect that would close a loop with the remembered
+        ones is not remembered, so following them always ends.
+        """
+        with self.lock:
+            self.redirects.pop(key, None)
+            if location == key or self._follow_redirects(location)[0] == key:
+                return
+            if len(self.redirects) >= REDIRECT_CACHE_LIMIT:
+                del self.redirects[next(iter(self.redirects))]
+            self.redirects[key] = (location, expires_at)
+
+    def resolve_redirect(self, key) -> str:
+        """
+        Return the url the remembered redirects of the key lead to, the key itself
+        if it is not remembered to redirect. Expired redirects are forgotten.
+        """
+        if not self.redirects:
+            return key
+        with self.lock:
+            location, hops = self._follow_redirects(key)
+            self.redirect_hops += hops
+        return location
+
+    def _follow_redirects(self, key) -> tuple:
+        """
+        Follow the remembered redirects from the key (at most REDIRECT_DEPTH of them)
+        and return (where they lead, how many were followed). The caller holds the lock.
+        """
+        now = time.time()
+        hops = 0
+        while hops < REDIRECT_DEPTH:
+            redirect = self.redirects.get(key)
+            if redirect is None:
+                break
+            location, expires_at = redirect
+            if expires_at <= now:
+                del self.redirects[key]
+                break
+            key = location
+            hops += 1
+        return key, hops
+
+    def _revalidate_in_background(self, key, stale):
+        """
+        Refetch or revalidate the stale value of the key on a daemon thread, 
+        unless that is already happening.
+        """
+        with self.lock:
+            if key in self.revalidating:
+                return
+            self.revalidating.add(key)
+
+        def revalidate():
+            try:
+                self._single_flight(key, lambda: _refetch(self, key, stale))
+            except Exception:
+                pass # the stale value stays; the next use tries again
+            finally:
+                with self.lock:
+                    self.revalidating.discard(key)
+
+        threading.Thread(target=revalidate, daemon=True).start()
+
+    def _stale_lookup(self, key) -> dict:
+        """
+        Return the cached value of the key whether it is fresh or not, None if
+        the key is not cached. The LRU order is not updated.
+        """
+        with self.lock:
+            if key in self.map.keys():
+                return self.map[key].value
+        if self.disk is not None:
+            return self._disk_lookup(key, fresh_only=False)
+        return None
+
+    def _disk_lookup(self, key, fresh_only=True) -> dict:
+        """
+        Return the value of the key rebuilt from the disk tier if it is there
+        (and fresh, with fresh_only), None otherwise.
+        """
+        record = self.disk.get(key)
+        if record is None or (fresh_only and not self._is_resource_fresh(record)):
+            return None
+        request = _http_request(get_url_components(key), "keep-alive")
+        response = HTTPResponse(record['status-line'], record['headers'], record['body'])
+        value = {'request': request, 'response': response}
+        for field in FRESHNESS_FIELDS:
+            value[field] = record.get(field)
+        return value
 
-    def _delete(self, node: CacheNode):
+    def _single_flight(self, key, fetch) -> tuple:
         """
-        Delete a cache slot from the cache by changing its 
-        pointers.
+        Return fetch() unless a fetch of the key is already in flight: then wait
+        for it and return (or raise) what it did, so simultaneous misses of a key
+        go to the network once. Only the parser of the first caller is fed; the
+        others get the response like one from the cache (see get()).
         """
-        node.pre.next = node.next
-        node.next.pre = node.pre
+        with self.lock:
+            flight = self.in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.in_flight[key] = Flight()
+        if not leader:
+            return flight.wait()
+
+        try:
+            flight.result = fetch()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                self.in_flight.pop(key)
+            flight.done.set()
+        return flight.result
+
+    def _put_in_memory(self, key, value):
+        """
+        A value bigger than the whole budget is not kept in memory (it would evict
+        every other node and then itself); an older value of its key is dropped.
+        """
+        size = _value_size(value)
+        with self.lock:
+            if size > self.max_bytes:
+                if key in self.map.keys():
+                    self._remove(self.map[key])
+                return
+            if key in self.map.keys():
+                node = self.map[key]
+                node.value = value
+                self.size += size - node.size
+                node.size = size
+                self.policy.touch(node)
+            else:
+                node = CacheNode(key, value, size)
+                self.map[key] = node
+                self.policy.add(node)
+                self.count += 1
+                self.size += size
+
+            while self.size > self.max_bytes or \
+                (self.capacity is not None and self.count > self.capacity):
+                self._remove(self.policy.victim())
+
+    def _remove(self, node: CacheNode):
+        self.policy.remove(node)
+        self.map.pop(node.key)
         self.count -= 1
+        self.size -= node.size
     
-    def _add_to_head(self, node: CacheNode):
+    def _is_resource_fresh(self, resource):
         """
-        Move the node to head.next effectively making it the most recent
-        used cache node. The subsequent cache nodes' recent usages are moved back
-        inherently.
-
-        WARNING: This function only changes the next's and pre's of the input node and
-        the head. node.pre.next and node.next.pre are still pointing to the node. 
-        Call self._delete(node) if neccessary.
+        Return if the cache node has not expired.
         """
-        node.next = self.head.next
-        self.head.next.pre = node
-        
-        node.pre = self.head
-        self.head.next = node
-        self.count += 1
+        return 'expires-at' in resource and resource['expires-at'] > time.time()
+
+class Flight:
+    """
+    A fetch in flight that other callers wait for (see Cache._single_flight).
+    """
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException = None
+
+    def wait(self) -> tuple:
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+def _value_size(value) -> int:
+    """
+    Return the bytes the body and the headers of the cached response take in memory.
+    """
+    res = value['response']
+    return sys.getsizeof(res.get_raw_body()) + \
+        sum(sys.getsizeof(header) + sys.getsizeof(header_value) \
+            for header, header_value in res.header._headers.items())
 
 """
-The cache of the browser
+The cache of the browser. It is backed by a disk cache only if the BROWSER_CACHE_DIR
+environment variable names a directory for it (e.g. ~/.cache/awesome-browser).
 """
-CENTRAL_CACHE = Cache()
+DISK_CACHE_DIR = os.environ.get("BROWSER_CACHE_DIR")
+CENTRAL_CACHE = Cache(disk=DiskCache(os.path.expanduser(DISK_CACHE_DIR)) if DISK_CACHE_DIR else None)
 
-def get(url) -> Union[HTTPResponse, FileResponse]:
+def get(url, parser: HTMLParser = None) -> Union[HTTPResponse, FileResponse]:
     """
     Use the browser cache to get the resources at the url.
     The cache miss cases are handled in the Cache class.
+
+    If a parser is given and the page comes from the network or a file, the body
+    is fed to the parser while it is downloaded or read (see create_http_response
+    and create_file_response). A page served from the cache is not fed; check 
+    parser.received to tell.
+
+    The cache is keyed by the canonical url (see url.url.canonical_url), so all the
+    spellings of a url share one entry.
     """
-    _, res = CENTRAL_CACHE.get(url)
+    _, res = CENTRAL_CACHE.get(canonical_url(url), parser)
     return res
 
+async def async_get(url) -> Union[HTTPResponse, FileResponse]:
+    """
+    The asyncio counterpart of get: the same cache, request headers, response 
+    parsing and redirects, but the network I/O is awaited on asyncio streams so
+    other fetches (or the caller's event loop) keep running meanwhile. Reading a
+    file and parsing a response block, so they run on the default executor.
+    """
+    key = CENTRAL_CACHE.resolve_redirect(canonical_url(url))
+    value = CENTRAL_CACHE.lookup(key)
+    if value is not None:
+        return value['response']
+
+    components = get_url_components(key)
+    if components.get_scheme() == Scheme.file:
+        value = await asyncio.to_thread(_file_get, components)
+    else:
+        value = await _async_http_get(components)
+
+    visited = {key}
+    for _ in range(REDIRECT_DEPTH):
+        new_url = _redirect_location(value)
+        if new_url is None: break
+        _remember_redirect(value, new_url)
+        new_url = CENTRAL_CACHE.resolve_redirect(new_url)
+        if new_url in visited: break
+        visited.add(new_url)
+        value = await _async_http_get(get_url_components(new_url))
+
+    _cache_if_appropriate(value)
+    return value['response']
+
+async def fetch_all(urls, concurrency=6) -> list:
+    """
+    Fetch all the urls with async_get, at most 'concurrency' at a time, and return
+    the responses in the order of the urls. A fetch that fails puts its exception 
+    in the list instead of cancelling the others.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(url):
+        async with semaphore:
+            return await async_get(url)
+
+    return await asyncio.gather(*[fetch(url) for url in urls], return_exceptions=True)
+
 
 
 ################################################
@@ -146,7 +421,7 @@ def get(url) -> Union[HTTPResponse, FileResponse]:
 ################################################
 
 
-def _cache_miss_get(url):
+def _cache_miss_get(url, parser: HTMLParser = None):
     """
     The key/url is not in the self.map.
     Fetch the response from the internet using the url while 
@@ -156,11 +431,11 @@ def _cache_miss_get(url):
     scheme = components.get_scheme()
 
     if scheme == Scheme.file:
-        value = _file_get(components)
+        value = _file_get(components, parser)
     elif scheme in [Scheme.http, Scheme.https]:
-        value = _http_get(components)
+        value = _http_get(components, parser)
 
-    value = _redirect_if_appropriate(value)
+    value = _redirect_if_appropriate(value, parser=parser)
     _cache_if_appropriate(value)
 
     return value['request'], value['response']
@@ -174,91 +449,339 @@ def _cache_if_appropriate(value):
     1. The request and the response are through HTTP connection AND
     2. The request is a GET method AND
     3. The response is an http response with 200 status code AND
-    4. The response contains cache-control header without "no-store" value. 
-    
-    For cache-control header, only "no-store" and "max-age" values are supported.
+    4. The response does not have "no-store" in its cache-control header AND
+    5. The response does not vary on everything ("Vary: *") AND
+    6. The response can be fresh for a while or can be revalidated (see _update_freshness).
+
+    The browser sends the same request headers for every url, so a cached response
+    satisfies any other vary header.
     """
     req, res = value['request'], value['response']
+    if not (isinstance(req, HTTPRequest) and isinstance(res, HTTPResponse)):
+        return
+    directives = _cache_control(res)
 
-    is_appropriate = isinstance(req, HTTPRequest) and \
-        isinstance(res, HTTPResponse) and \
-        res.get_status_code() == 200 and \
+    is_appropriate = res.get_status_code() == 200 and \
         req.is_get_method() and \
-        res.contains_header('cache-control') and \
-        'no-store' not in res.get_header_value('cache-control')
+        'no-store' not in directives and \
+        not (res.contains_header('vary') and res.get_header_value('vary').strip() == '*')
     
-    if is_appropriate:
-        key = req.get_original_url()
+    if is_appropriate and _update_freshness(value):
+        key = req.get_canonical_url()
+        CENTRAL_CACHE.put(key, value)
+
+"""
+The freshness fields a cached value keeps besides its request and response,
+as times since the epoch (None if the response does not allow it):
+expires-at                  : until when the response is fresh.
+stale-while-revalidate-until: until when it may be served stale while revalidating.
+stale-if-error-until        : until when it may be served stale if the network fails.
+"""
+FRESHNESS_FIELDS = ['expires-at', 'stale-while-revalidate-until', 'stale-if-error-until']
 
-        match = re.search(r'max-age=\d+', res.get_header_value('cache-control'))
-        if match is None: return
-        match_gp = match.group()
+def _update_freshness(value) -> bool:
+    """
+    Set the freshness fields of the value from the cache headers of its response 
+    (cache-control, expires, date and age). Return if the response is worth caching: 
+    it is fresh for a while or it has validators to be revalidated with.
 
-        max_age = match_gp.replace('max-age=', '')
+    A response with "no-cache" or without a freshness lifetime is stored already
+    expired, so it is revalidated on every use. "must-revalidate" forbids serving
+    it stale in any case.
+    """
+    res = value['response']
+    directives = _cache_control(res)
+    lifetime = freshness_lifetime(res.header._headers, directives)
+    if 'no-cache' in directives:
+        lifetime = None
+    if lifetime is None and not _has_validators(res):
+        return False
+
+    now = int(time.time())
+    if lifetime is None:
+        expires_at = now
+    else:
         age = res.get_header_value('age') if res.contains_header('age') else 0
-        value['expires-at'] = int(time.time()) + int(max_age) - int(age)
+        expires_at = now + lifetime - int(age)
+    value['expires-at'] = expires_at
+
+    for directive, field in [('stale-while-revalidate', 'stale-while-revalidate-until'),\
+                             ('stale-if-error', 'stale-if-error-until')]:
+        window = directives.get(directive)
+        if isinstance(window, int) and 'must-revalidate' not in directives:
+            value[field] = expires_at + window
+        else:
+            value[field] = None
+    return True
 
-        CENTRAL_CACHE.put(key, value)
+def _cache_control(res: HTTPResponse) -> dict:
+    if not res.contains_header('cache-control'): return {}
+    return parse_cache_control(res.get_header_value('cache-control'))
+
+def _may_serve_stale(value, field) -> bool:
+    """
+    Return if the stale value is still within the window of the freshness field.
+    """
+    return value.get(field) is not None and value[field] > time.time()
+
+def _has_validators(res: HTTPResponse) -> bool:
+    """
+    Return if the response can be revalidated with a conditional request.
+    """
+    return res.contains_header('etag') or res.contains_header('last-modified')
+
+"""
+Statuses of a failed refetch after which a stale response may be served instead
+"""
+SERVER_ERRORS = [500, 502, 503, 504]
+
+def _refetch(cache: Cache, url, stale, parser: HTMLParser = None):
+    """
+    Get the url again for its stale value cached in the cache: revalidate it if
+    it has validators, fetch it like a cache miss otherwise.
+    """
+    if _has_validators(stale['response']):
+        return _revalidate_get(cache, url, stale, parser)
+    return _cache_miss_get(url, parser)
+
+"""
+Headers of a 304 response that describe its own (empty) body and must not
+replace those of the cached response.
+"""
+BODY_HEADERS = ['content-length', 'transfer-encoding', 'content-encoding']
+
+def _revalidate_get(cache: Cache, url, value, parser: HTMLParser = None):
+    """
+    Ask the server whether the expired value of the url cached in the cache is still
+    current, with If-None-Match/If-Modified-Since headers. On 304 Not Modified, the
+    cached response gets the new headers and expiry and is returned without
+    downloading the body again. Otherwise the new response is handled like a cache miss.
+
+    Other threads may be using the cached response, so its headers are replaced by
+    an updated copy under the lock of the cache instead of being changed in place.
+    """
+    req, res = value['request'], value['response']
+    headers = {}
+    if res.contains_header('etag'):
+        headers['If-None-Match'] = res.get_header_value('etag')
+    if res.contains_header('last-modified'):
+        headers['If-Modified-Since'] = res.get_header_value('last-modified')
+
+    new_value = _http_get(get_url_components(url), parser, headers)
+    new_res = new_value['response']
+    if new_res.get_status_code() == 304:
+        headers = dict(res.header._headers)
+        for header, header_value in new_res.header._headers.items():
+            if header not in BODY_HEADERS:
+                headers[header] = header_value
+        with cache.lock:
+            res.header._headers = headers
+            _update_freshness(value)
+        cache.refresh(url, value)
+        return req, res
+
+    new_value = _redirect_if_appropriate(new_value, parser=parser)
+    _cache_if_appropriate(new_value)
+    return new_value['request'], new_value['response']
 
 
 REDIRECT_DEPTH = 10
 
-def _redirect_if_appropriate(value, counter=0):
+def _redirect_if_appropriate(value, counter=0, parser: HTMLParser = None, visited: set = None):
     """
     Redirect based on the http response headers up to REDIRECT_DEPTH depths.
-    The new url is either completely in the "location" header or we have to reuse
-    the original hostname using the path in the "location" header. 
+    The "location" header is resolved against the url of the request (see _redirect_location).
+
+    Every cacheable redirect on the way is remembered (see _remember_redirect) and
+    the ones remembered before are skipped. A redirect back to a url of the chain
+    is a loop: the redirect response is returned as if the depth was exceeded.
     """
     if counter >= REDIRECT_DEPTH:
         return value
     
+    new_url = _redirect_location(value)
+    if new_url is not None:
+        if visited is None:
+            visited = {value['request'].get_canonical_url()}
+        _remember_redirect(value, new_url)
+        new_url = CENTRAL_CACHE.resolve_redirect(new_url)
+        if new_url in visited:
+            return value
+        visited.add(new_url)
+        components = get_url_components(new_url)
+        value = _http_get(components, parser)
+        return _redirect_if_appropriate(value, counter + 1, parser, visited)
+        
+    return value
+
+"""
+Permanent redirects are cached for PERMANENT_REDIRECT_LIFETIME seconds unless
+their headers give a freshness lifetime. Temporary ones only with such a lifetime.
+At most REDIRECT_CACHE_LIMIT redirects are remembered, the first one is dropped first.
+"""
+PERMANENT_REDIRECTS = [301, 308]
+TEMPORARY_REDIRECTS = [302, 307]
+PERMANENT_REDIRECT_LIFETIME = 24 * 60 * 60
+REDIRECT_CACHE_LIMIT = 1024
+
+def _remember_redirect(value, location):
+    """
+    Put the redirect of the (request, response) value to the location in the cache
+    of redirects if it is cacheable: a GET redirect with a status in PERMANENT_REDIRECTS
+    or TEMPORARY_REDIRECTS that is fresh for a while and does not forbid storing it.
+    """
+    req, res = value['request'], value['response']
+    status = res.get_status_code()
+    if not req.is_get_method() or status not in PERMANENT_REDIRECTS + TEMPORARY_REDIRECTS:
+        return
+    directives = _cache_control(res)
+    if 'no-store' in directives or 'no-cache' in directives or \
+        (res.contains_header('vary') and res.get_header_value('vary').strip() == '*'):
+        return
+
+    lifetime = freshness_lifetime(res.header._headers, directives)
+    if lifetime is None and status in PERMANENT_REDIRECTS:
+        lifetime = PERMANENT_REDIRECT_LIFETIME
+    if lifetime is None:
+        return
+    age = int(res.get_header_value('age')) if res.contains_header('age') else 0
+    if lifetime - age > 0:
+        CENTRAL_CACHE.put_redirect(req.get_canonical_url(), location, time.time() + lifetime - age)
+
+def _redirect_location(value):
+    """
+    Return the url the (request, response) value redirects to, None if it is not a redirect.
+    The location may be relative to the url of the request (e.g. "/path", "../path"
+    or "//host/path"); the url returned is absolute and canonical.
+    """
     req, res = value['request'], value['response']
     if isinstance(req, HTTPRequest) and isinstance(res, HTTPResponse):
         if res.is_redirect() and res.contains_header('location'):
-            new_url = res.get_header_value('location')
-            if new_url.startswith("/"):
-                new_url = req.get_scheme() + "://" + req.get_host() + new_url
-            components = get_url_components(new_url)
-            value = _http_get(components)
-            return _redirect_if_appropriate(value, counter + 1)
-        
-    return value
+            return resolve_url(req.get_canonical_url(), res.get_header_value('location'))
+    return None
     
-def _http_get(components: HttpURL) -> dict:
+def _http_get(components: HttpURL, parser: HTMLParser = None, headers: dict = None) -> dict:
     """
     Return a (request, response) tuple from http connection. 
      
-    The socket is created usign the HttpURL object.
+    The socket is taken from the connection pool using the HttpURL object, so 
+    requests to the same origin (e.g. a redirect chain) share a kept-alive connection.
 
     The request is created using the HttpURL object and a set of headers ("Host",
-    "Connetion", "User-Agent", "Accept-Encoding").
+    "Connetion", "User-Agent", "Accept-Encoding"), plus the given headers if any.
 
     The request is received through Socket object and created as a 
-    response.response.HTTPResponse object.
+    response.response.HTTPResponse object, feeding the parser (if any) on the way.
+    A pooled connection the server has closed in the meantime is replaced by a 
+    new one once.
     """
-    httpSocket = Socket()
-    httpSocket.connect(components)
+    request = _http_request(components, "keep-alive", headers)
+
+    while True:
+        httpSocket, reused = CONNECTION_POOL.acquire(components)
+        try:
+            request_bytes = request.get_http_request_bytes()
+            with stage("send", sent=len(request_bytes)):
+                httpSocket.send(request_bytes)
+            response = create_http_response(httpSocket.receive(), parser)
+        except OSError:
+            CONNECTION_POOL.release(httpSocket, reusable=False)
+            if reused and (parser is None or parser.received == 0):
+                continue
+            raise
+        except BaseException:
+            CONNECTION_POOL.release(httpSocket, reusable=False)
+            raise
+        CONNECTION_POOL.release(httpSocket, response.is_keep_alive())
+        trace = current_trace()
+        if trace is not None:
+            trace.add("status", response.get_status_code())
+        return {'request': request, 'response': response}
+
+async def _async_http_get(components: HttpURL) -> dict:
+    """
+    The asyncio counterpart of _http_get. The connection is not pooled: the request
+    asks the server to close it and the whole response is read up to the end of the
+    stream, then handed to create_http_response like a socket stream would be.
+    """
+    request = _http_request(components, "close")
+
+    ssl_context = get_ssl_context() if components.get_scheme() == Scheme.https else None
+    reader, writer = await asyncio.open_connection(
+        components.get_host(), components.get_port(), ssl=ssl_context)
+    try:
+        writer.write(request.get_http_request_bytes())
+        await writer.drain()
+        raw = await reader.read()
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass # the server reset the connection after its response
+
+    # Decompressing and decoding a large body would hold up the event loop.
+    response = await asyncio.to_thread(create_http_response, io.BufferedReader(io.BytesIO(raw)))
+    return {'request': request, 'response': response}
 
-    headers = {"Host": components.get_host(),\
-                "Connection": "close",\
+def _http_request(components: HttpURL, connection: str, extra_headers: dict = None) -> HTTPRequest:
+    """
+    Return the GET request the browser sends for the components.
+    """
+    headers = {"Host": components.get_netloc(),\
+                "Connection": connection,\
                 "User-Agent": "Awesome Browser",\
-                "Accept-Encoding": "gzip"}
-    request = HTTPRequest(components, headers=headers)
-
-    httpSocket.send(request.get_http_request_bytes())
-    response = create_http_response(httpSocket.receive())
-    httpSocket.disconnect()
-    return {'request': request, 'response': response}
+                "Accept-Encoding": "gzip, deflate"}
+    if extra_headers:
+        headers.update(extra_headers)
+    return HTTPRequest(components, headers=headers)
 
-def _file_get(components: FileURL) -> dict:
+def _file_get(components: FileURL, parser: HTMLParser = None) -> dict:
 
     """
     Return a (request, response) tuple from disk.    
+    The parser, if any, is fed the file while it is read (see create_file_response).
     """
     request = FileRequest(components)
-    response = create_file_response(request)
+    with stage("file", path=request.get_path()):
+        if request.is_dir():
+            response = create_file_response(_list_directory(request.get_path()), parser)
+        else:
+            response = create_file_response(open(request.get_path(), 'rb'), parser)
     return {'request': request, 'response': response}
 
+"""
+The names in the directories listed so far, by path, with the modification time
+of the directory they were listed at: a directory is only listed again once an
+entry was added, removed or renamed in it. At most DIRECTORY_LISTINGS_LIMIT
+directories are remembered, the first listed one is dropped first.
+"""
+DIRECTORY_LISTINGS: dict[str, tuple] = {} # path -> (st_mtime_ns, names)
+DIRECTORY_LISTINGS_LIMIT = 256
+
+def _list_directory(path):
+    """
+    Return the names in the directory: from DIRECTORY_LISTINGS if it did not change,
+    otherwise a generator of the names as os.scandir reads them, which remembers
+    the listing once it is read to the end.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    listing = DIRECTORY_LISTINGS.get(path)
+    if listing is not None and listing[0] == mtime:
+        return listing[1]
+    return _scan_directory(path, mtime)
+
+def _scan_directory(path, mtime):
+    names = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            names.append(entry.name)
+            yield entry.name
+    DIRECTORY_LISTINGS.pop(path, None)
+    if len(DIRECTORY_LISTINGS) >= DIRECTORY_LISTINGS_LIMIT:
+        DIRECTORY_LISTINGS.pop(next(iter(DIRECTORY_LISTINGS)), None)
+    DIRECTORY_LISTINGS[path] = (mtime, names)
+
 
     
 
@@ -1,8 +1,11 @@
 from enum import Enum, auto
+import re
+from functools import lru_cache
 from util import *
 from typing import Union
+from data.connection import stage
 
-__all__ = ['Scheme', 'get_url_components', 'HttpURL', 'FileURL']
+__all__ = ['Scheme', 'get_url_components', 'canonical_url', 'resolve_url', 'HttpURL', 'FileURL']
 
 
 class Scheme(Enum):
@@ -14,32 +17,58 @@ class Scheme(Enum):
     https = auto()
     file = auto()
 
+DEFAULT_PORTS = {Scheme.http: 80, Scheme.https: 443}
+
 class HttpURL():
     """
         Define the split version of url string if the scheme is http/https.
         When port number is not provided, default port number for http/https are 
         used: 80 and 443 respectively. 
+
+        The scheme and the host are lower-cased, an empty path is "/", the dot
+        segments of the path are removed and the fragment is dropped (it is never
+        sent to the server). An IPv6 host is written in brackets in the url,
+        e.g. http://[::1]:8080/, and kept without them.
     """
     def __init__(self, url: str) -> None:
         self._original_url = url      
         scheme, url = url.split("://", 1)
         self._scheme = Scheme[scheme.lower()]
 
-        host, path = url.split("/", 1)
-        self._host = host
-
-        path = "/" + path
-        self._path = path
-
-        self._port = 80 if self._scheme == Scheme.http else 443
-
-        if ":" in self._host:
-            self._host, port = self._host.split(":", 1)
+        # The authority (host and port) ends at the path, the query or the fragment.
+        end = len(url)
+        for delimiter in "/?#":
+            index = url.find(delimiter)
+            if index != -1 and index < end:
+                end = index
+        authority, path = url[:end], url[end:]
+
+        path = path.split("#", 1)[0]
+        path, query = path.split("?", 1) if "?" in path else (path, None)
+        path = _remove_dot_segments(path) if path else "/"
+        if not path.startswith("/"):
+            path = "/" + path
+        self._path = path if query is None else path + "?" + query
+
+        self._port = DEFAULT_PORTS[self._scheme]
+
+        if authority.startswith("["):
+            host, _, port = authority[1:].partition("]")
+            port = port[1:] if port.startswith(":") else port
+        else:
+            host, _, port = authority.partition(":")
+        self._host = host.lower()
+        if port:
             try:
                 self._port = int(port)
             except ValueError:
                 raise ValueError("Invalid port in the URL: {}".format(port))
 
+        self._netloc = "[" + self._host + "]" if ":" in self._host else self._host
+        if self._port != DEFAULT_PORTS[self._scheme]:
+            self._netloc += ":{}".format(self._port)
+        self._canonical_url = "{}://{}{}".format(self._scheme.name, self._netloc, self._path)
+
     def get_scheme(self) -> Scheme:
         return self._scheme
 
@@ -51,21 +80,39 @@ class HttpURL():
  
     def get_port(self) -> int:
         return self._port
+
+    def get_netloc(self) -> str:
+        """
+        Returns the host (in brackets if IPv6) and the port unless it is the
+        default one of the scheme: the value of the Host header.
+        """
+        return self._netloc
     
     def get_original_url(self) -> str:
         return self._original_url    
 
+    def get_canonical_url(self) -> str:
+        """
+        Returns the url in its normal form (see the class docstring). Urls that
+        only differ in how they are spelled have the same canonical url, so it
+        is the key of the url in the caches.
+        """
+        return self._canonical_url
+
 class FileURL():
     def __init__(self, url: str) -> None:
         scheme, path = url.split("://", 1)
         self._scheme = Scheme[scheme.lower()]
-        self._path = path
+        self._path = path or "/"
 
     def get_scheme(self) -> Scheme:
         return self._scheme
 
     def get_path(self) -> str:
         return self._path
+
+    def get_canonical_url(self) -> str:
+        return "file://" + self._path
     
 def get_url_components(url: str) -> Union[HttpURL, FileURL]:
     """
@@ -74,7 +121,20 @@ def get_url_components(url: str) -> Union[HttpURL, FileURL]:
     The function will raise 
     1. KeyError if the scheme is not supported by the browser
     2. ValueError if the provided port number is not valid.
+
+    The components of the last URL_CACHE_SIZE urls are remembered (they are never
+    changed once made), so a url used over and over is split only once.
     """
+    with stage("url", url=url):
+        return _parse_url(url)
+
+"""
+The number of urls whose components get_url_components remembers
+"""
+URL_CACHE_SIZE = 1024
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def _parse_url(url: str) -> Union[HttpURL, FileURL]:
     url = _preprocess_url(url)
     scheme = Scheme[url.split("://", 1)[0].lower()]
     if scheme in [Scheme.http, Scheme.https]:
@@ -82,16 +142,77 @@ def get_url_components(url: str) -> Union[HttpURL, FileURL]:
     elif scheme == Scheme.file:
         return FileURL(url)
 
+def canonical_url(url: str) -> str:
+    """
+    Return the canonical url of the url string (see HttpURL.get_canonical_url),
+    e.g. "http://example.com/" for "example.com" and "HTTP://Example.com:80".
+    Raise like get_url_components.
+    """
+    return get_url_components(url).get_canonical_url()
+
+"""
+The start of an absolute url: a scheme (RFC 3986 section 3.1) and a colon
+"""
+SCHEME_PREFIX = re.compile(r"[A-Za-z][A-Za-z0-9+.-]*:")
+
+def resolve_url(base: str, reference: str) -> str:
+    """
+    Return the canonical url a reference (e.g. the location of a redirect) points
+    to from the base url (RFC 3986 section 5.2): an absolute url is taken as is,
+    "//host/path" keeps the scheme of the base, "/path" its host and port, and a
+    relative path is resolved against the directory of the base path.
+    A reference is absolute only if it starts with a scheme, so a query holding
+    a url (e.g. "/login?next=http://example.com/") stays relative.
+    """
+    components = get_url_components(base)
+    if SCHEME_PREFIX.match(reference):
+        return canonical_url(reference)
+
+    scheme = components.get_scheme().name
+    if reference.startswith("//"):
+        return canonical_url(scheme + ":" + reference)
+    if isinstance(components, FileURL):
+        origin, path = "file://", components.get_path()
+    else:
+        origin, path = scheme + "://" + components.get_netloc(), components.get_path()
+
+    if reference == "" or reference.startswith("#"):
+        return canonical_url(origin + path)
+    if reference.startswith("?"):
+        return canonical_url(origin + path.split("?", 1)[0] + reference)
+    if reference.startswith("/"):
+        return canonical_url(origin + reference)
+    directory = path.split("?", 1)[0].rsplit("/", 1)[0]
+    return canonical_url(origin + directory + "/" + reference)
+
+def _remove_dot_segments(path: str) -> str:
+    """
+    Remove the "." and ".." segments of the path (RFC 3986 section 5.2.4).
+    """
+    if "." not in path:
+        return path
+    segments = []
+    parts = path.split("/")
+    for part in parts:
+        if part == "..":
+            if len(segments) > 1:
+                segments.pop()
+        elif part != ".":
+            segments.append(part)
+    if parts[-1] in (".", ".."):
+        segments.append("")
+    return "/".join(segments)
+
 def _preprocess_url(url: str):
     """
-    Preprocess (see below) the url string that does not properly include a scheme and a path.
+    Preprocess (see below) the url string that does not properly include a scheme.
     If the scheme is not supported, raise KeyError.
 
     Preprocessing:
     1. If there is no "://" string, prepend http scheme and "://" string.
     2. Otherwise, if there is no scheme, just prepend http scheme.
-    3. Add a path "/" if there is no path.
 
+    A missing path is added by the [scheme]URL objects.
     The resulting url does not guarantee a valid url address but it should be able to 
     pass to the point of connection.
     """
@@ -104,17 +225,11 @@ def _preprocess_url(url: str):
     elif len(url_split[0]) == 0:
         url = "http" + url
     
-    scheme, host = url.split("://", 1)
+    scheme = url.split("://", 1)[0]
 
     try:
         Scheme[scheme.lower()]
     except KeyError:
         raise KeyError("Invalid scheme in the URL: {}".format(scheme.lower()))
 
-    if len(host.split("/", 1)) < 2:
-        url += "/"
-
     return url    
-
-        
-